@@ -0,0 +1,124 @@
+import cv2
+import numpy as np
+from pathlib import Path
+
+INDEX_DTYPE = np.dtype([
+    ('segment', np.int32),
+    ('frame', np.int32),
+    ('timestamp', np.float64),
+    ('shard', np.int32),
+    ('offset', np.int64),
+    ('length', np.int32),
+])
+
+
+class FrameShardWriter:
+    """
+    Pack encoded frames into large append-only shard files.
+
+    Frames are appended as encoded images to shard_XXXX.bin until a shard
+    reaches shard_size bytes; index.npy records where each frame lives.
+    """
+
+    def __init__(self, output_dir, shard_size=1 << 30, image_format='jpg', quality=95):
+        """
+        Args:
+            output_dir: Directory for the shards and the index
+            shard_size: Approximate maximum size of a shard file in bytes (default: 1 GiB)
+            image_format: Encoding of the frames, 'jpg' or 'png' (default: 'jpg')
+            quality: JPEG quality (default: 95)
+        """
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.shard_size = shard_size
+        self.ext = f".{image_format}"
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, quality] if image_format == 'jpg' else []
+        self.entries = []
+        self.shard_idx = -1
+        self.shard_file = None
+        self._next_shard()
+
+    def _next_shard(self):
+        if self.shard_file:
+            self.shard_file.close()
+        self.shard_idx += 1
+        self.shard_file = open(self.output_dir / f"shard_{self.shard_idx:04d}.bin", 'wb')
+
+    def add_frame(self, segment_idx, frame_idx, timestamp, frame):
+        """Encode a frame and append it to the current shard."""
+        ok, buf = cv2.imencode(self.ext, frame, self.params)
+        if not ok:
+            raise RuntimeError(f"Could not encode frame {frame_idx} of segment {segment_idx}")
+        if self.shard_file.tell() > 0 and self.shard_file.tell() + len(buf) > self.shard_size:
+            self._next_shard()
+        offset = self.shard_file.tell()
+        self.shard_file.write(buf.tobytes())
+        self.entries.append((segment_idx, frame_idx, timestamp, self.shard_idx, offset, len(buf)))
+
+    def close(self):
+        """Close the last shard and write the index."""
+        self.shard_file.close()
+        np.save(self.output_dir / "index.npy", np.array(self.entries, dtype=INDEX_DTYPE))
+        print(f"  Packed {len(self.entries)} frames into {self.shard_idx + 1} shard(s) in {self.output_dir}")
+
+
+class FrameShardReader:
+    """
+    Random-access reader for frames packed by FrameShardWriter.
+    Shards are memory-mapped, so a frame read is a single slice and decode.
+    """
+
+    def __init__(self, shard_dir):
+        self.shard_dir = Path(shard_dir)
+        self.index = np.load(self.shard_dir / "index.npy")
+        self._shards = {}
+        # Sorted keys for lookup by (segment, frame) and by timestamp
+        self._keys = self.index['segment'].astype(np.int64) << 32 | self.index['frame'].astype(np.int64)
+        self._key_order = np.argsort(self._keys, kind='stable')
+        self._time_order = np.argsort(self.index['timestamp'], kind='stable')
+
+    def __len__(self):
+        return len(self.index)
+
+    def _shard(self, shard_idx):
+        if shard_idx not in self._shards:
+            self._shards[shard_idx] = np.memmap(self.shard_dir / f"shard_{shard_idx:04d}.bin", dtype=np.uint8, mode='r')
+        return self._shards[shard_idx]
+
+    def read_encoded(self, i):
+        """Encoded bytes of the i-th frame in the index."""
+        entry = self.index[i]
+        shard = self._shard(int(entry['shard']))
+        return shard[entry['offset']:entry['offset'] + entry['length']]
+
+    def read(self, i):
+        """Decoded BGR image of the i-th frame in the index."""
+        return cv2.imdecode(np.asarray(self.read_encoded(i)), cv2.IMREAD_COLOR)
+
+    def find(self, segment_idx, frame_idx):
+        """Index position of a frame given its segment and frame number."""
+        key = np.int64(segment_idx) << 32 | np.int64(frame_idx)
+        pos = np.searchsorted(self._keys, key, sorter=self._key_order)
+        if pos == len(self._keys) or self._keys[self._key_order[pos]] != key:
+            raise KeyError(f"Frame {frame_idx} of segment {segment_idx} not found")
+        return int(self._key_order[pos])
+
+    def get_frame(self, segment_idx, frame_idx):
+        """Decoded frame by segment and frame number."""
+        return self.read(self.find(segment_idx, frame_idx))
+
+    def get_frame_at(self, timestamp):
+        """Decoded frame nearest to a video time in seconds, with its timestamp."""
+        times = self.index['timestamp']
+        pos = np.searchsorted(times, timestamp, sorter=self._time_order)
+        candidates = self._time_order[max(0, pos - 1):pos + 1]
+        i = int(candidates[np.argmin(np.abs(times[candidates] - timestamp))])
+        return self.read(i), float(times[i])
+
+    def iter_frames(self, segment_idx=None):
+        """Yield (segment, frame, timestamp, image) in storage order, optionally for one segment."""
+        for i in range(len(self.index)):
+            entry = self.index[i]
+            if segment_idx is not None and entry['segment'] != segment_idx:
+                continue
+            yield int(entry['segment']), int(entry['frame']), float(entry['timestamp']), self.read(i)
@@ -4,6 +4,7 @@ import argparse
 import subprocess
 import json
 from pathlib import Path
+from frame_shards import FrameShardWriter
 
 
 def get_video_info(video_path):
@@ -71,10 +72,15 @@ def split_video_into_segments(video_path, segments_dir, segment_duration=60):
     return segments
 
 
-def extract_frames_from_segment(segment_path, frames_dir, segment_idx):
-    """Extract all frames from a video segment."""
-    segment_frames_dir = frames_dir / f"segment_{segment_idx:04d}"
-    segment_frames_dir.mkdir(exist_ok=True)
+def extract_frames_from_segment(segment_path, frames_dir, segment_idx, shard_writer=None, segment_start=0.0):
+    """
+    Extract all frames from a video segment.
+    Frames are written as individual images, or appended to shard_writer if given
+    with timestamps counted from segment_start (seconds into the full video).
+    """
+    if shard_writer is None:
+        segment_frames_dir = frames_dir / f"segment_{segment_idx:04d}"
+        segment_frames_dir.mkdir(parents=True, exist_ok=True)
     
     # Set OpenCV read attempts to handle multi-stream videos
     os.environ['OPENCV_FFMPEG_READ_ATTEMPTS'] = '10000'
@@ -83,6 +89,7 @@ def extract_frames_from_segment(segment_path, frames_dir, segment_idx):
     if not cap.isOpened():
         print(f"  Warning: Could not open {segment_path.name}")
         return 0
+    fps = cap.get(cv2.CAP_PROP_FPS)
     
     frame_idx = 0
     consecutive_failures = 0
@@ -99,9 +106,12 @@ def extract_frames_from_segment(segment_path, frames_dir, segment_idx):
         
         consecutive_failures = 0
         
-        # Save frame as image
-        frame_filename = segment_frames_dir / f"frame_{frame_idx:06d}.jpg"
-        cv2.imwrite(str(frame_filename), frame)
+        if shard_writer is not None:
+            shard_writer.add_frame(segment_idx, frame_idx, segment_start + frame_idx / fps, frame)
+        else:
+            # Save frame as image
+            frame_filename = segment_frames_dir / f"frame_{frame_idx:06d}.jpg"
+            cv2.imwrite(str(frame_filename), frame)
         
         frame_idx += 1
         
@@ -114,7 +124,7 @@ def extract_frames_from_segment(segment_path, frames_dir, segment_idx):
     return frame_idx
 
 
-def parse_video_into_segments(video_path, output_dir, segment_duration=60):
+def parse_video_into_segments(video_path, output_dir, segment_duration=60, output_mode='files'):
     """
     Parse a video into segments and extract frames from each segment.
     
@@ -122,6 +132,8 @@ def parse_video_into_segments(video_path, output_dir, segment_duration=60):
         video_path: Path to the input video file
         output_dir: Directory to store outputs
         segment_duration: Duration of each segment in seconds (default: 60)
+        output_mode: 'files' for one JPEG per frame, or 'shards' to pack frames
+                     into shard files readable with frame_shards.FrameShardReader
     """
     # Create output directories
     output_path = Path(output_dir)
@@ -149,12 +161,18 @@ def parse_video_into_segments(video_path, output_dir, segment_duration=60):
     # Step 2: Extract frames from each segment
     print(f"\nExtracting frames from segments...")
     total_frames = 0
+    shard_writer = FrameShardWriter(frames_dir) if output_mode == 'shards' else None
     
     for idx, segment_path in enumerate(segments):
         print(f"Processing segment {idx}...")
-        frame_count = extract_frames_from_segment(segment_path, frames_dir, idx)
+        # Segments are cut at keyframes, so their start is counted in frames
+        segment_start = total_frames / video_info['fps']
+        frame_count = extract_frames_from_segment(segment_path, frames_dir, idx, shard_writer, segment_start)
         total_frames += frame_count
     
+    if shard_writer is not None:
+        shard_writer.close()
+    
     print(f"\nProcessing complete!")
     print(f"  Total segments: {len(segments)}")
     print(f"  Total frames: {total_frames}")
@@ -0,0 +1,146 @@
+import os
+import cv2
+import numpy as np
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from process_video import get_timecode
+from utils import timecode_to_datetime, to_timestamp
+
+
+def _timecode_start(timecode, fps, base_date):
+    """Turn a get_timecode result (timecode or creation time) into POSIX seconds."""
+    # Drop-frame timecodes use ';' before the frame count (HH:MM:SS;FF); the label
+    # already tracks wall-clock time, so it is read like a non-drop timecode
+    tc = timecode.replace(';', ':')
+    if tc.count(':') == 3 and '-' not in tc:
+        return timecode_to_datetime(tc, fps, base_date).timestamp()
+    # Fallback value from get_timecode is an ISO creation time
+    return datetime.fromisoformat(timecode.replace('Z', '+00:00')).timestamp()
+
+
+def build_camera_session(video_paths, base_date, offsets=None, timecodes=None):
+    """
+    Describe a set of cameras on the global clock.
+    Args:
+        video_paths: List of camera video paths
+        base_date: datetime.date of the recording
+        offsets: Optional dict {video_path: seconds} of corrections added to each
+                 camera's timecode start (e.g. from audio cross-correlation)
+        timecodes: Optional dict {video_path: timecode} to skip probing
+    Returns:
+        List of camera dicts with name, path, fps, frame count and global start time
+    """
+    offsets = offsets or {}
+    timecodes = timecodes or {}
+    cameras = []
+    for path in video_paths:
+        cap = cv2.VideoCapture(str(path))
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video file {path}")
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+
+        timecode = timecodes.get(path) or get_timecode(path)
+        start_time = _timecode_start(timecode, fps, base_date) + offsets.get(path, 0.0)
+        cameras.append({
+            'name': os.path.splitext(os.path.basename(path))[0],
+            'path': str(path),
+            'fps': fps,
+            'n_frames': n_frames,
+            'start_time': start_time,
+        })
+        print(f"Camera {cameras[-1]['name']}: timecode {timecode}, {fps:.2f} fps, {n_frames} frames")
+    return cameras
+
+
+def resolve_frame_index(camera, global_time):
+    """Frame index of a camera showing the given global time (datetime or POSIX seconds)."""
+    return int(round((to_timestamp(global_time) - camera['start_time']) * camera['fps']))
+
+
+def _read_camera_frames(camera, start_time, end_time):
+    first = max(0, resolve_frame_index(camera, start_time))
+    last = min(camera['n_frames'] - 1, resolve_frame_index(camera, end_time))
+    if last < first:
+        return []
+
+    os.environ['OPENCV_FFMPEG_READ_ATTEMPTS'] = '10000'
+    cap = cv2.VideoCapture(camera['path'])
+    if not cap.isOpened():
+        print(f"Error: Could not open video file {camera['path']}")
+        return []
+    cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+
+    frames = []
+    for frame_idx in range(first, last + 1):
+        ret, frame = cap.read()
+        if not ret:
+            print(f"Warning: {camera['name']} stopped at frame {frame_idx}")
+            break
+        frames.append((frame_idx, frame))
+    cap.release()
+    return frames
+
+
+def get_synchronized_frames(cameras, start_time, end_time=None):
+    """
+    Decode the frames every camera shows at a global time (or time range).
+    One worker per camera decodes concurrently.
+    Args:
+        cameras: Camera dicts from build_camera_session
+        start_time: Global time (datetime or POSIX seconds)
+        end_time: Optional end of a global time range (inclusive)
+    Returns:
+        Dict {camera name: [(frame_idx, frame), ...]}; a single time yields at most
+        one frame per camera, cameras not recording at that time yield []
+    """
+    if end_time is None:
+        end_time = start_time
+    with ThreadPoolExecutor(max_workers=max(1, len(cameras))) as pool:
+        futures = {cam['name']: pool.submit(_read_camera_frames, cam, start_time, end_time) for cam in cameras}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def make_contact_sheet(frames_by_camera, columns=4, tile_width=480, output_path=None):
+    """
+    Tile one frame per camera into a single labelled image.
+    Args:
+        frames_by_camera: Result of get_synchronized_frames (first frame of each camera is used)
+        columns: Number of tiles per row (default: 4)
+        tile_width: Width of each tile in pixels (default: 480)
+        output_path: Optional path to save the sheet
+    Returns:
+        The contact sheet as a BGR image array
+    """
+    tiles = []
+    tile_height = None
+    for name, frames in frames_by_camera.items():
+        if frames:
+            frame_idx, frame = frames[0]
+            h, w = frame.shape[:2]
+            tile = cv2.resize(frame, (tile_width, int(round(h * tile_width / w))))
+            label = f"{name} #{frame_idx}"
+        else:
+            tile = None
+            label = f"{name} (no frame)"
+        tiles.append((label, tile))
+        if tile is not None and tile_height is None:
+            tile_height = tile.shape[0]
+    if tile_height is None:
+        tile_height = tile_width * 9 // 16
+
+    rows = (len(tiles) + columns - 1) // columns
+    sheet = np.zeros((rows * tile_height, columns * tile_width, 3), dtype=np.uint8)
+    for i, (label, tile) in enumerate(tiles):
+        r, c = divmod(i, columns)
+        y, x = r * tile_height, c * tile_width
+        if tile is not None:
+            tile = tile[:tile_height]
+            sheet[y:y + tile.shape[0], x:x + tile_width] = tile
+        cv2.putText(sheet, label, (x + 10, y + 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
+
+    if output_path:
+        cv2.imwrite(str(output_path), sheet)
+        print(f"Contact sheet saved to: {output_path}")
+    return sheet
@@ -0,0 +1,212 @@
+import os
+import json
+import subprocess
+import soundfile as sf
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from process_microphone import build_file_timeline, read_audio_range
+from process_midge import TIMEZONE, MidgeSession
+from utils import to_timestamp
+
+# Encoders used for exact cuts, matching the source's codec family
+REENCODERS = {'h264': 'libx264', 'hevc': 'libx265'}
+
+
+def probe_video(video_path):
+    """Duration and video codec of a file using ffprobe."""
+    cmd = [
+        'ffprobe', '-v', 'quiet',
+        '-print_format', 'json',
+        '-show_format', '-show_streams',
+        video_path
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    info = json.loads(result.stdout)
+    video_stream = next((s for s in info['streams'] if s['codec_type'] == 'video'), None)
+    if not video_stream:
+        raise ValueError(f"No video stream found in {video_path}")
+    return {'duration': float(info['format']['duration']), 'codec': video_stream['codec_name']}
+
+
+def previous_keyframe(video_path, t, search_window=20.0):
+    """Time of the last video keyframe at or before t (local seconds), or 0.0 if none is found."""
+    cmd = [
+        'ffprobe', '-v', 'error',
+        '-select_streams', 'v:0',
+        '-read_intervals', f"{max(0.0, t - search_window)}%{t + 1.0}",
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0',
+        video_path
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    keyframe = 0.0
+    for line in result.stdout.splitlines():
+        parts = line.split(',')
+        if len(parts) >= 2 and parts[0] not in ('', 'N/A') and 'K' in parts[1]:
+            pts = float(parts[0])
+            if keyframe < pts <= t + 1e-3:
+                keyframe = pts
+    return keyframe
+
+
+def _run_ffmpeg(cmd):
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"Error running ffmpeg: {result.stderr[-500:]}")
+        raise RuntimeError(f"ffmpeg failed for {cmd[-1]}")
+
+
+def cut_video(video_path, local_start, local_end, output_path, exact=False):
+    """
+    Cut [local_start, local_end] seconds of a video (with audio).
+    Without exact, the streams are copied and the clip starts at the keyframe
+    at or before local_start (see previous_keyframe). With exact, the whole
+    clip is re-encoded in the source's codec family so it starts on local_start.
+    """
+    duration = local_end - local_start
+    if not exact:
+        _run_ffmpeg(['ffmpeg', '-y', '-v', 'error', '-ss', f"{local_start:.6f}", '-i', video_path,
+                     '-t', f"{duration:.6f}", '-map', '0:v:0', '-map', '0:a?', '-c', 'copy',
+                     '-avoid_negative_ts', 'make_zero', output_path])
+        return output_path
+
+    # Splicing a re-encoded head onto a stream-copied tail would mix codec
+    # parameter sets in one MP4 track, so the whole clip is re-encoded
+    encoder = REENCODERS.get(probe_video(video_path)['codec'], 'libx264')
+    _run_ffmpeg(['ffmpeg', '-y', '-v', 'error', '-ss', f"{local_start:.6f}", '-i', video_path,
+                 '-t', f"{duration:.6f}", '-map', '0:v:0', '-map', '0:a?',
+                 '-c:v', encoder, '-crf', '16', '-preset', 'fast', '-c:a', 'aac', output_path])
+    return output_path
+
+
+def cut_wav(wav_path, local_start, local_end, output_path, track_index=None):
+    """Sample-exact slice of a WAV file, optionally keeping a single track."""
+    with sf.SoundFile(wav_path) as f:
+        start_sample = int(round(local_start * f.samplerate))
+        end_sample = min(int(round(local_end * f.samplerate)), f.frames)
+        f.seek(start_sample)
+        data = f.read(end_sample - start_sample, dtype='int32' if 'PCM' in f.subtype else 'float32', always_2d=True)
+        if track_index is not None:
+            data = data[:, track_index]
+        sf.write(output_path, data, f.samplerate, subtype=f.subtype)
+    return output_path
+
+
+def cut_midge(session, start, end, output_path):
+    """Window of a midge session between two global times, sample-gridded on block timestamps (gaps are silence)."""
+    data, rate = session.load_on_grid(start, end, gap_value=0.0)
+    sf.write(output_path, data, rate, subtype='FLOAT')
+    return output_path
+
+
+def cut_recorder_track(source, start, end, output_path):
+    """
+    Window of one recorder track between two global times, read across file
+    boundaries (WAVs or per-track archives) with read_audio_range; gaps are silence.
+    """
+    time_zero = source['time_zero']
+    data, _, gaps = read_audio_range(source['timeline'], source.get('track', 0), start - time_zero,
+                                     end - time_zero, source['samplerate'], gap_value=0.0)
+    if gaps:
+        print(f"Warning: {source['name']} has {len(gaps)} gap(s) between recorder files in {output_path}")
+    sf.write(output_path, data, source['samplerate'], subtype='FLOAT')
+    return output_path
+
+
+def _prepare_source(source):
+    """Index midge and recorder sources once so every window reuses it."""
+    if 'midge_dir' in source:
+        return dict(source, session=MidgeSession(source['midge_dir'], source.get('block_size', 1024)))
+    if 'recorder_dir' in source:
+        day_start = datetime.combine(date.fromisoformat(str(source['base_date'])), datetime.min.time(),
+                                     tzinfo=TIMEZONE).timestamp()
+        return dict(source, timeline=build_file_timeline(source['recorder_dir'], source['fps']),
+                    time_zero=day_start + source.get('offset', 0.0))
+    if os.path.isdir(source['path']):
+        raise ValueError(f"{source['name']}: {source['path']} is a directory; "
+                         f"pass recorder folders as 'recorder_dir'")
+    return source
+
+
+def _source_span(source):
+    """Global (start, end) time covered by a source."""
+    if 'midge_dir' in source:
+        return source['session'].start_time, source['session'].end_time
+    if 'recorder_dir' in source:
+        if not source['timeline']:
+            raise ValueError(f"{source['name']}: no recorder files with a timecode in {source['recorder_dir']}")
+        return (source['time_zero'] + source['timeline'][0]['start_time'],
+                source['time_zero'] + max(entry['end_time'] for entry in source['timeline']))
+    offset = to_timestamp(source['start_time'])
+    if source['path'].lower().endswith('.wav'):
+        return offset, offset + sf.info(source['path']).duration
+    return offset, offset + probe_video(source['path'])['duration']
+
+
+def export_clips(sources, windows, output_dir, exact=False, max_workers=4):
+    """
+    Cut the same global windows out of every source in parallel.
+
+    Clips are trimmed to the part of the window a source actually covers; each
+    window directory gets a clips.json with the global start and end of
+    every clip as written, and a warning is printed when a clip is shorter than its window.
+    Args:
+        sources: List of dicts with 'name', 'path' and 'start_time' (global time of the
+                 file's first sample, offsets applied), and optionally 'track' for WAVs.
+                 Camera dicts from camera_frames.build_camera_session can be passed as is.
+                 Midges are given as {'name', 'midge_dir'} (optionally 'block_size') and
+                 are cut on their block timestamps through process_midge.MidgeSession.
+                 Recorder tracks are given as {'name', 'recorder_dir', 'fps', 'samplerate',
+                 'base_date', 'track'} (optionally 'offset', seconds added to the timecode)
+                 and are read across recorder files and archives like the plotter does.
+        windows: List of (start, end) global times (datetime or POSIX seconds)
+        output_dir: Output directory; clips go to window_XXX/<name>.<ext>
+        exact: Re-encode videos for frame-exact cuts; otherwise video clips are stream
+               copies starting at the preceding keyframe, and clips.json gives
+               that keyframe's time as the clip start (default: False)
+        max_workers: Number of concurrent cuts (default: 4)
+    Returns:
+        List of written clip paths
+    """
+    sources = [_prepare_source(source) for source in sources]
+    spans = [_source_span(source) for source in sources]
+    jobs = []
+    for window_idx, (start, end) in enumerate(windows):
+        start, end = to_timestamp(start), to_timestamp(end)
+        window_dir = os.path.join(output_dir, f"window_{window_idx:03d}")
+        os.makedirs(window_dir, exist_ok=True)
+        manifest = {'start': start, 'end': end, 'clips': {}}
+        for source, (span_start, span_end) in zip(sources, spans):
+            clip_start, clip_end = max(start, span_start), min(end, span_end)
+            if clip_end <= clip_start:
+                print(f"Window {window_idx}: {source['name']} not recording, skipped")
+                continue
+            if clip_start > start or clip_end < end:
+                print(f"Warning: window {window_idx}: {source['name']} only covers "
+                      f"{clip_start - start:+.3f}s to {clip_end - start:+.3f}s of the window")
+            if 'midge_dir' in source:
+                output_path = os.path.join(window_dir, f"{source['name']}.wav")
+                jobs.append((cut_midge, source['session'], clip_start, clip_end, output_path))
+            elif 'recorder_dir' in source:
+                output_path = os.path.join(window_dir, f"{source['name']}.wav")
+                jobs.append((cut_recorder_track, source, clip_start, clip_end, output_path))
+            else:
+                ext = os.path.splitext(source['path'])[1]
+                output_path = os.path.join(window_dir, f"{source['name']}{ext}")
+                local_start, local_end = clip_start - span_start, clip_end - span_start
+                if ext.lower() == '.wav':
+                    jobs.append((cut_wav, source['path'], local_start, local_end, output_path, source.get('track')))
+                else:
+                    jobs.append((cut_video, source['path'], local_start, local_end, output_path, exact))
+                    if not exact:
+                        # Stream copy starts at the keyframe before the window
+                        clip_start = span_start + previous_keyframe(source['path'], local_start)
+            manifest['clips'][source['name']] = {'path': os.path.basename(output_path),
+                                                 'start': clip_start, 'end': clip_end}
+        with open(os.path.join(window_dir, 'clips.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+    print(f"Exporting {len(jobs)} clips for {len(windows)} window(s)...")
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(func, *args) for func, *args in jobs]
+        return [future.result() for future in futures]
@@ -0,0 +1,176 @@
+import os
+import json
+import hashlib
+import numpy as np
+import soundfile as sf
+from scipy import signal
+from utils import find_signal_offset
+
+FEATURE_CACHE_DIR = os.path.join("data", "features")
+
+
+def feature_params(feature_rate=100, n_bands=8, fmin=100.0, fmax=8000.0, block_seconds=10.0):
+    """Feature extraction parameters; part of the cache key."""
+    return {'feature_rate': feature_rate, 'n_bands': n_bands, 'fmin': fmin, 'fmax': fmax,
+            'block_seconds': block_seconds}
+
+
+def source_cache_key(path, track_index, params):
+    """Cache key from file identity (path, size, mtime), track and parameters."""
+    stat = os.stat(path)
+    ident = json.dumps([os.path.abspath(path), stat.st_size, stat.st_mtime, track_index, params], sort_keys=True)
+    return hashlib.sha1(ident.encode('utf-8')).hexdigest()[:16]
+
+
+def _frame_features(frames, rate, band_edges):
+    """Envelope and log-band energies of non-overlapping frames (n_frames, hop)."""
+    envelope = np.sqrt(np.mean(np.square(frames), axis=1))
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(frames.shape[1]).astype(np.float32), axis=1)) ** 2
+    freqs = np.fft.rfftfreq(frames.shape[1], 1.0 / rate)
+    bands = np.stack([spectrum[:, (freqs >= lo) & (freqs < hi)].sum(axis=1)
+                      for lo, hi in zip(band_edges[:-1], band_edges[1:])], axis=1)
+    return envelope.astype(np.float32), np.log10(bands + 1e-10).astype(np.float32)
+
+
+def _block_ffts(envelope, block_len):
+    """FFTs of zero-mean envelope blocks, zero-padded for linear cross-correlation."""
+    n_blocks = len(envelope) // block_len
+    if n_blocks == 0:
+        return np.zeros((0, block_len + 1), dtype=np.complex64)
+    blocks = envelope[:n_blocks * block_len].reshape(n_blocks, block_len)
+    blocks = blocks - blocks.mean(axis=1, keepdims=True)
+    return np.fft.rfft(blocks, n=2 * block_len, axis=1).astype(np.complex64)
+
+
+def extract_features(path, track_index=0, params=None):
+    """
+    Compute the features of one audio source in a single streaming pass.
+    Args:
+        path: Audio file readable by soundfile (camera WAV, midge WAV, recorder WAV)
+        track_index: Channel to use (default: 0)
+        params: Parameters from feature_params (default: feature_params())
+    Returns:
+        Dict with 'envelope' (feature_rate), 'bands' (n_frames, n_bands) log energies,
+        'block_fft' (n_blocks, block_len + 1) and 'feature_rate'
+    """
+    params = params or feature_params()
+    info = sf.info(path)
+    rate = info.samplerate
+    hop = int(round(rate / params['feature_rate']))
+    band_edges = np.geomspace(params['fmin'], min(params['fmax'], rate / 2), params['n_bands'] + 1)
+
+    envelopes, bands = [], []
+    carry = np.zeros(0, dtype=np.float32)
+    for block in sf.blocks(path, blocksize=hop * 6000, dtype='float32', always_2d=True):
+        data = np.concatenate([carry, block[:, track_index]])
+        n_frames = len(data) // hop
+        if n_frames:
+            env, band = _frame_features(data[:n_frames * hop].reshape(n_frames, hop), rate, band_edges)
+            envelopes.append(env)
+            bands.append(band)
+        carry = data[n_frames * hop:]
+
+    envelope = np.concatenate(envelopes) if envelopes else np.zeros(0, dtype=np.float32)
+    block_len = int(round(params['block_seconds'] * params['feature_rate']))
+    return {
+        'envelope': envelope,
+        'bands': np.concatenate(bands) if bands else np.zeros((0, params['n_bands']), dtype=np.float32),
+        'block_fft': _block_ffts(envelope, block_len),
+        'feature_rate': float(params['feature_rate']),
+        'block_len': block_len,
+        'samplerate': rate,
+    }
+
+
+def load_features(path, track_index=0, params=None, cache_dir=FEATURE_CACHE_DIR):
+    """
+    Features of a source, computed once and then read back from the on-disk cache.
+    The cache entry is invalidated when the file or the parameters change.
+    """
+    params = params or feature_params()
+    name = os.path.splitext(os.path.basename(path))[0]
+    cache_path = os.path.join(cache_dir, f"{name}_t{track_index}_{source_cache_key(path, track_index, params)}.npz")
+    if os.path.exists(cache_path):
+        cached = np.load(cache_path)
+        return {k: (cached[k].item() if cached[k].ndim == 0 else cached[k]) for k in cached.files}
+
+    print(f"Extracting features from {path} (track {track_index})")
+    features = extract_features(path, track_index, params)
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez(cache_path, **features)
+    return features
+
+
+def _standardize(x):
+    x = x - x.mean(axis=0)
+    std = x.std(axis=0)
+    return x / np.where(std > 0, std, 1)
+
+
+def correlate_features(features1, features2, feature='envelope'):
+    """
+    Offset between two sources from their cached features.
+    Args:
+        features1, features2: Results of load_features
+        feature: 'envelope' or 'bands' (sum of per-band correlations)
+    Returns:
+        time_diff: Offset in seconds (positive when an event in source 2 appears later in source 1)
+        peak_score: Normalized correlation peak
+    """
+    rate = features1['feature_rate']
+    if feature == 'envelope':
+        a = features1['envelope'] - features1['envelope'].mean()
+        b = features2['envelope'] - features2['envelope'].mean()
+        time_diff, _, _, peak_score = find_signal_offset(a, b, rate)
+        return time_diff, peak_score
+    if feature == 'bands':
+        a = _standardize(features1['bands'])
+        b = _standardize(features2['bands'])
+        correlation = sum(signal.correlate(a[:, k], b[:, k], mode='full') for k in range(a.shape[1]))
+        lags = signal.correlation_lags(len(a), len(b), mode='full')
+        idx = np.argmax(correlation)
+        peak_score = float(correlation[idx] / (np.linalg.norm(a) * np.linalg.norm(b) or 1))
+        return lags[idx] / rate, peak_score
+    raise ValueError(f"Unknown feature: {feature}")
+
+
+def block_offsets(features1, features2):
+    """
+    Per-block lag between two roughly aligned sources using the cached block FFTs.
+    The lag of each block pair is searched within +/- one block length, so the
+    series shows how the offset evolves (clock drift) over the recording.
+    Returns:
+        Array of lags in seconds, one per common block
+    """
+    F1, F2 = features1['block_fft'], features2['block_fft']
+    n = min(len(F1), len(F2))
+    if n == 0:
+        return np.zeros(0)
+    correlation = np.fft.irfft(F1[:n] * np.conj(F2[:n]), axis=1)
+    nfft = correlation.shape[1]
+    lags = np.argmax(correlation, axis=1)
+    lags = np.where(lags > nfft // 2, lags - nfft, lags)
+    return lags / features1['feature_rate']
+
+
+def compute_pairwise_offsets(features_by_source, feature='envelope'):
+    """
+    Offsets between all pairs of sources in feature space.
+    Args:
+        features_by_source: Dict {name: features from load_features}
+        feature: Feature to correlate (see correlate_features)
+    Returns:
+        names, offsets (n x n, seconds) and scores (n x n); offsets[i, j] is
+        positive when an event in source j appears later in source i
+    """
+    names = list(features_by_source)
+    n = len(names)
+    offsets = np.zeros((n, n))
+    scores = np.eye(n)
+    for i in range(n):
+        for j in range(i + 1, n):
+            time_diff, score = correlate_features(features_by_source[names[i]], features_by_source[names[j]], feature)
+            offsets[i, j], offsets[j, i] = time_diff, -time_diff
+            scores[i, j] = scores[j, i] = score
+            print(f"{names[i]} vs {names[j]}: {time_diff:+.3f}s (score {score:.3f})")
+    return names, offsets, scores
@@ -0,0 +1,444 @@
+import os
+import re
+import time
+import struct
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from process_microphone import get_file_info, timecode_to_seconds
+from utils import find_signal_offset, to_float32
+
+TIMEZONE = timezone(timedelta(hours=2))
+ENVELOPE_RATE = 100  # Rate of the running envelopes used for offset checks
+
+
+def parse_wav_header(path):
+    """
+    Parse the RIFF header of a (possibly still growing) WAV file.
+    Returns:
+        Dict with channels, samplerate, bits, format tag, block_align,
+        data_offset and the data size declared in the header
+    """
+    with open(path, 'rb') as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] not in (b'RIFF', b'RF64', b'BW64') or riff[8:12] != b'WAVE':
+            raise ValueError(f"Not a WAV file (or header not written yet): {path}")
+        layout = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                raise ValueError(f"No data chunk yet in {path}")
+            chunk_id, size = chunk[:4], struct.unpack('<I', chunk[4:])[0]
+            if chunk_id == b'fmt ':
+                body = f.read(size + (size & 1))
+                fmt_tag, channels, rate, _, block_align, bits = struct.unpack('<HHIIHH', body[:16])
+                if fmt_tag == 0xFFFE:  # WAVE_FORMAT_EXTENSIBLE: real tag is in the sub-format GUID
+                    fmt_tag = struct.unpack('<H', body[24:26])[0]
+                layout = {'format': fmt_tag, 'channels': channels, 'samplerate': rate,
+                          'block_align': block_align, 'bits': bits}
+            elif chunk_id == b'data':
+                if layout is None:
+                    raise ValueError(f"Data chunk before fmt chunk in {path}")
+                layout['data_offset'] = f.tell()
+                layout['data_size'] = size
+                return layout
+            else:
+                f.seek(size + (size & 1), 1)
+
+
+def decode_pcm(raw, layout, channel=None):
+    """
+    Decode interleaved WAV sample bytes into a float32 (frames, channels) array.
+    With channel given, only that channel's bytes are decoded and the result is (frames, 1).
+    """
+    bits = layout['bits']
+    channels = layout['channels']
+    if channel is not None:
+        width = bits // 8
+        frames = np.frombuffer(raw, dtype=np.uint8).reshape(-1, layout['block_align'])
+        raw = frames[:, channel * width:(channel + 1) * width].tobytes()
+        channels = 1
+    if layout['format'] == 3:
+        data = np.frombuffer(raw, dtype='<f4' if bits == 32 else '<f8')
+    elif bits == 24:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        # Left-justify into int32 so the sign bit lands in place
+        data = (b[:, 0] << 8) | (b[:, 1] << 16) | (b[:, 2] << 24)
+    else:
+        data = np.frombuffer(raw, dtype={8: np.uint8, 16: '<i2', 32: '<i4'}[bits])
+        data = data.astype(data.dtype.newbyteorder('='))
+    return to_float32(data).reshape(-1, channels)
+
+
+class LiveWavReader:
+    """
+    Tail a WAV file that may still be being written, returning only new frames.
+
+    The number of available frames comes from the header when the recorder has
+    filled in the data size, and from the file size otherwise.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.layout = None
+        self.frames_read = 0
+
+    def available_frames(self):
+        try:
+            layout = parse_wav_header(self.path)
+        except ValueError:
+            return 0
+        self.layout = layout
+        data_size = layout['data_size']
+        if not 0 < data_size < 0xFFFFFFFF:
+            data_size = os.path.getsize(self.path) - layout['data_offset']
+        return max(data_size, 0) // layout['block_align']
+
+    def read_new(self, channel=None, block_frames=1 << 16):
+        """
+        Yield the frames appended since the last call as float32 blocks.
+        Args:
+            channel: Only decode this channel (default: all channels)
+            block_frames: Maximum frames read and decoded at once, bounding memory
+                          when a large file is first picked up (default: 65536)
+        Yields:
+            (first frame index, float32 array of shape (frames, channels or 1))
+        """
+        available = self.available_frames()
+        if available <= self.frames_read:
+            return
+        block_align = self.layout['block_align']
+        with open(self.path, 'rb') as f:
+            f.seek(self.layout['data_offset'] + self.frames_read * block_align)
+            while self.frames_read < available:
+                n_frames = min(block_frames, available - self.frames_read)
+                raw = f.read(n_frames * block_align)
+                n_frames = len(raw) // block_align
+                if n_frames == 0:
+                    break
+                first = self.frames_read
+                self.frames_read += n_frames
+                yield first, decode_pcm(raw[:n_frames * block_align], self.layout, channel)
+
+
+class LiveTimestampReader:
+    """Tail a midge -ts.txt sidecar, returning only newly completed lines."""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.count = 0
+
+    def read_new(self):
+        """Read new unix-millisecond timestamps (complete lines only)."""
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            raw = f.read()
+        # Keep a partially written last line for the next poll
+        end = raw.rfind(b'\n') + 1
+        self.offset += end
+        values = [int(line) for line in raw[:end].split() if line.strip()]
+        self.count += len(values)
+        return values
+
+
+class LiveTimeline:
+    """
+    Incremental version of build_file_timeline.
+    Each recorder file is probed once for its timecode; its end time is
+    updated from the current file length while it keeps growing.
+    """
+
+    def __init__(self, audio_dir, fps):
+        self.audio_dir = audio_dir
+        self.fps = fps
+        self.entries = {}
+        self.skipped = set()
+
+    def update(self):
+        """Pick up new files and extend growing ones. Returns the sorted timeline."""
+        for fname in sorted(os.listdir(self.audio_dir)):
+            if not fname.lower().endswith('.wav'):
+                continue
+            full_path = os.path.join(self.audio_dir, fname)
+            if full_path in self.skipped:
+                continue
+            entry = self.entries.get(full_path)
+            if entry is None:
+                try:
+                    layout = parse_wav_header(full_path)
+                    timecode, _ = get_file_info(full_path)
+                except ValueError as e:
+                    # Header or metadata not complete yet; try again on the next poll
+                    print(f"Recorder file {fname} not ready yet ({e})")
+                    continue
+                except KeyError:
+                    # The header parsed but ffprobe reports no format tags
+                    timecode = None
+                if not timecode:
+                    print(f"Skipping recorder file {fname}: no timecode")
+                    self.skipped.add(full_path)
+                    continue
+                start_sec = timecode_to_seconds(timecode, self.fps)
+                entry = {'filename': full_path, 'start_time': start_sec, 'end_time': start_sec,
+                         'reader': LiveWavReader(full_path), 'samplerate': layout['samplerate']}
+                self.entries[full_path] = entry
+                print(f"New recorder file: {fname} starting at {timecode}")
+            entry['end_time'] = entry['start_time'] + entry['reader'].available_frames() / entry['samplerate']
+        return self.timeline()
+
+    def timeline(self):
+        return sorted(({k: e[k] for k in ('filename', 'start_time', 'end_time')} for e in self.entries.values()),
+                      key=lambda e: e['start_time'])
+
+
+class _RunningEnvelope:
+    """Block-RMS envelope of an incoming signal with the sample index of every value."""
+
+    def __init__(self, rate, max_seconds=600):
+        self.hop = max(1, int(rate // ENVELOPE_RATE))
+        self.max_len = int(max_seconds * ENVELOPE_RATE)
+        self.pending = np.zeros(0, dtype=np.float32)
+        self.pending_start = 0
+        self.values = np.zeros(0, dtype=np.float32)
+        self.sample_idx = np.zeros(0, dtype=np.int64)
+
+    def push(self, data, first_sample):
+        if len(self.pending) == 0 or first_sample != self.pending_start + len(self.pending):
+            # Start over on a discontinuity (e.g. the next file)
+            self.pending = np.zeros(0, dtype=np.float32)
+            self.pending_start = first_sample
+        self.pending = np.concatenate([self.pending, data])
+        n_hops = len(self.pending) // self.hop
+        if n_hops == 0:
+            return
+        blocks = self.pending[:n_hops * self.hop].reshape(n_hops, self.hop)
+        env = np.sqrt(np.mean(np.square(blocks), axis=1))
+        idx = self.pending_start + np.arange(n_hops) * self.hop
+        self.values = np.concatenate([self.values, env])[-self.max_len:]
+        self.sample_idx = np.concatenate([self.sample_idx, idx])[-self.max_len:]
+        self.pending = self.pending[n_hops * self.hop:]
+        self.pending_start += n_hops * self.hop
+
+
+class LiveMidgeSource:
+    """
+    Follow the recordings of one midge badge as they are written.
+
+    New `<unix_ms>_audio_<n>.wav` files and their -ts.txt sidecars are picked up
+    in order. A running least-squares fit of block timestamp against sample
+    index gives the badge's clock offset and drift without re-reading old data.
+    Pass block_size=None to infer the samples per timestamp from the first data.
+    """
+
+    def __init__(self, name, directory, block_size=1024):
+        self.name = name
+        self.directory = directory
+        self.block_size = block_size
+        self.files = []
+        self.current = None
+        self.envelope = None
+        self.rate = None
+
+    def _new_file(self, wav_path):
+        base = os.path.splitext(wav_path)[0]
+        self.current = {
+            'path': wav_path,
+            'audio': LiveWavReader(wav_path),
+            'timestamps': LiveTimestampReader(base + '-ts.txt'),
+            'samples': 0,
+            'blocks': 0,
+            'pending_ts': [],
+            # Sums for the fit t = a + b * sample, centred on the first timestamp
+            't0': None, 'n': 0, 'sx': 0.0, 'sy': 0.0, 'sxx': 0.0, 'sxy': 0.0,
+        }
+        self.files.append(wav_path)
+        print(f"{self.name}: following {os.path.basename(wav_path)}")
+
+    def poll(self):
+        """Read newly written audio and timestamps. Returns the number of new samples."""
+        pattern = re.compile(r'(\d+)_audio_\d+\.wav$')
+        candidates = sorted((f for f in os.listdir(self.directory) if pattern.search(f)),
+                            key=lambda f: int(pattern.search(f).group(1)))
+        new_files = [os.path.join(self.directory, f) for f in candidates
+                     if os.path.join(self.directory, f) not in self.files]
+        # Drain the file being followed before moving on to newer ones
+        n_new = self._poll_current()
+        for wav_path in new_files:
+            self._new_file(wav_path)
+            n_new += self._poll_current()
+        return n_new
+
+    def _poll_current(self):
+        cur = self.current
+        if cur is None:
+            return 0
+        n_new = 0
+        for _, data in cur['audio'].read_new(channel=0):
+            if self.envelope is None:
+                self.rate = cur['audio'].layout['samplerate']
+                self.envelope = _RunningEnvelope(self.rate)
+            self.envelope.push(data[:, 0], self._file_base() + cur['samples'])
+            cur['samples'] += len(data)
+            n_new += len(data)
+        cur['pending_ts'].extend(cur['timestamps'].read_new())
+
+        if self.block_size is None and cur['timestamps'].count >= 10 and cur['samples'] > 0:
+            # Infer the block size once, as plot_midge_audio does for whole files
+            self.block_size = max(1, int(round(cur['samples'] / cur['timestamps'].count)))
+            print(f"{self.name}: inferred block size {self.block_size}")
+        if self.block_size:
+            for ms in cur['pending_ts']:
+                t = ms / 1000.0
+                if cur['t0'] is None:
+                    cur['t0'] = t
+                x = float(cur['blocks'] * self.block_size)
+                y = t - cur['t0']
+                cur['n'] += 1
+                cur['sx'] += x
+                cur['sy'] += y
+                cur['sxx'] += x * x
+                cur['sxy'] += x * y
+                cur['blocks'] += 1
+            cur['pending_ts'] = []
+        return n_new
+
+    def _file_base(self):
+        # Envelope sample indices are offset per file so files never overlap
+        return (len(self.files) - 1) << 40
+
+    def clock(self):
+        """
+        Current clock fit of the followed file.
+        Returns:
+            (start_time, effective_rate, drift) with start_time in POSIX seconds and
+            drift relative to the nominal sample rate, or None before two timestamps
+        """
+        cur = self.current
+        if cur is None or cur['n'] < 2 or self.envelope is None:
+            return None
+        n, sx, sy, sxx, sxy = cur['n'], cur['sx'], cur['sy'], cur['sxx'], cur['sxy']
+        denom = n * sxx - sx * sx
+        if denom == 0:
+            return None
+        slope = (n * sxy - sx * sy) / denom
+        intercept = (sy - slope * sx) / n
+        effective_rate = 1.0 / slope
+        return cur['t0'] + intercept, effective_rate, effective_rate / self.rate - 1.0
+
+    def envelope_times(self):
+        """Envelope values of the followed file with their global times (POSIX seconds)."""
+        fit = self.clock()
+        if fit is None:
+            return None, None
+        start_time, effective_rate, _ = fit
+        base = self._file_base()
+        mask = self.envelope.sample_idx >= base
+        times = start_time + (self.envelope.sample_idx[mask] - base) / effective_rate
+        return times, self.envelope.values[mask]
+
+
+class LiveRecorderSource:
+    """Follow one track of the multitrack recorder as files are written."""
+
+    def __init__(self, name, audio_dir, track_index, fps, base_date, tz=TIMEZONE):
+        self.name = name
+        self.timeline = LiveTimeline(audio_dir, fps)
+        self.track_index = track_index
+        self.day_start = datetime.combine(base_date, datetime.min.time(), tzinfo=tz).timestamp()
+        self.envelopes = {}
+
+    def poll(self):
+        """Read newly written frames of every recorder file. Returns the number of new samples."""
+        self.timeline.update()
+        n_new = 0
+        for path, entry in self.timeline.entries.items():
+            env = self.envelopes.setdefault(path, _RunningEnvelope(entry['samplerate']))
+            for first, data in entry['reader'].read_new(channel=self.track_index):
+                env.push(data[:, 0], first)
+                n_new += len(data)
+        return n_new
+
+    def envelope_times(self):
+        """Envelope values of the latest recorder file with their global times (POSIX seconds)."""
+        if not self.envelopes:
+            return None, None
+        path = max(self.envelopes, key=lambda p: self.timeline.entries[p]['start_time'])
+        entry = self.timeline.entries[path]
+        env = self.envelopes[path]
+        times = self.day_start + entry['start_time'] + env.sample_idx / entry['samplerate']
+        return times, env.values
+
+
+class LiveSession:
+    """
+    Incremental sync checks for a session that is still being recorded.
+
+    Each poll reads only what was appended since the previous one; offsets
+    between sources are re-estimated on the most recent window of their
+    running envelopes and accumulated into a running estimate.
+    """
+
+    def __init__(self):
+        self.sources = {}
+        self.offset_history = {}
+
+    def add_midge(self, name, directory, block_size=1024):
+        self.sources[name] = LiveMidgeSource(name, directory, block_size)
+
+    def add_recorder_track(self, name, audio_dir, track_index, fps, base_date, tz=TIMEZONE):
+        self.sources[name] = LiveRecorderSource(name, audio_dir, track_index, fps, base_date, tz)
+
+    def poll(self):
+        """Ingest new data from every source. Returns {source name: new samples}."""
+        return {name: source.poll() for name, source in self.sources.items()}
+
+    def estimate_offset(self, name1, name2, window=30.0):
+        """
+        Residual offset between two sources over their latest common window.
+        Returns:
+            (offset, peak_score, running_median) or None if there is not enough overlap;
+            offset is positive when an event in name2 appears later in name1
+        """
+        t1, v1 = self.sources[name1].envelope_times()
+        t2, v2 = self.sources[name2].envelope_times()
+        if t1 is None or t2 is None or len(t1) < 2 or len(t2) < 2:
+            return None
+        end = min(t1[-1], t2[-1])
+        start = max(end - window, t1[0], t2[0])
+        if end - start < window / 2:
+            return None
+        grid = np.arange(start, end, 1.0 / ENVELOPE_RATE)
+        a = np.interp(grid, t1, v1).astype(np.float32)
+        b = np.interp(grid, t2, v2).astype(np.float32)
+        a -= a.mean()
+        b -= b.mean()
+        offset, _, _, peak_score = find_signal_offset(a, b, ENVELOPE_RATE)
+        history = self.offset_history.setdefault((name1, name2), [])
+        history.append(offset)
+        return offset, peak_score, float(np.median(history))
+
+    def report(self, pairs, window=30.0):
+        """Print clock drift of midges and running offsets of the given source pairs."""
+        for name, source in self.sources.items():
+            if isinstance(source, LiveMidgeSource):
+                fit = source.clock()
+                if fit is not None:
+                    print(f"{name}: effective rate {fit[1]:.2f} Hz, drift {fit[2] * 1e6:+.1f} ppm")
+        for name1, name2 in pairs:
+            result = self.estimate_offset(name1, name2, window)
+            if result is None:
+                print(f"{name1} vs {name2}: not enough overlap yet")
+            else:
+                offset, score, median = result
+                print(f"{name1} vs {name2}: offset {offset:+.3f}s (score {score:.2f}), running median {median:+.3f}s")
+
+
+def watch(session, pairs, interval=10.0, window=30.0):
+    """Poll a live session forever, printing sync sanity checks after every poll."""
+    while True:
+        new = session.poll()
+        print(f"\n[{datetime.now(TIMEZONE):%H:%M:%S}] new samples: {new}")
+        session.report(pairs, window)
+        time.sleep(interval)
@@ -0,0 +1,88 @@
+import os
+import numpy as np
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from utils import find_signal_offset
+
+# Per-worker view of the shared signals, set up once by _attach_signals
+_worker_state = {}
+
+
+def _share_signals(signals):
+    """Copy all signals (zero-mean float32) into one shared memory block."""
+    layout = {}
+    offset = 0
+    for name, data in signals.items():
+        layout[name] = (offset, len(data))
+        offset += len(data)
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1) * 4)
+    buffer = np.ndarray((offset,), dtype=np.float32, buffer=shm.buf)
+    for name, data in signals.items():
+        start, length = layout[name]
+        buffer[start:start + length] = data
+        buffer[start:start + length] -= buffer[start:start + length].mean() if length else 0
+    return shm, layout
+
+
+def _attach_signals(shm_name, layout, total, rate):
+    """Pool initializer: attach to the shared block without copying it."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker_state['shm'] = shm
+    _worker_state['buffer'] = np.ndarray((total,), dtype=np.float32, buffer=shm.buf)
+    _worker_state['layout'] = layout
+    _worker_state['rate'] = rate
+
+
+def _correlate_pair(pair):
+    name1, name2 = pair
+    buffer, layout = _worker_state['buffer'], _worker_state['layout']
+    start1, len1 = layout[name1]
+    start2, len2 = layout[name2]
+    time_diff, _, _, peak_score = find_signal_offset(
+        buffer[start1:start1 + len1], buffer[start2:start2 + len2], _worker_state['rate'])
+    return name1, name2, float(time_diff), peak_score
+
+
+def parallel_pairwise_offsets(signals, rate, pairs=None, max_workers=None):
+    """
+    Correlate many sources pairwise on a process pool.
+
+    Each signal is placed once in shared memory; workers attach to it when
+    they start, so pair jobs only carry two source names and return a lag and
+    a peak score.
+    Args:
+        signals: Dict {name: 1-D decimated signal}, all at the same rate
+                 (e.g. the 'envelope' of feature_cache.load_features)
+        rate: Common sample rate of the signals
+        pairs: Optional list of (name1, name2) pairs (default: all pairs)
+        max_workers: Number of worker processes (default: CPU count)
+    Returns:
+        names, offsets (n x n, seconds) and scores (n x n); offsets[i, j] is
+        positive when an event in source j appears later in source i
+    """
+    names = list(signals)
+    index = {name: i for i, name in enumerate(names)}
+    if pairs is None:
+        pairs = [(names[i], names[j]) for i in range(len(names)) for j in range(i + 1, len(names))]
+    max_workers = max_workers or os.cpu_count() or 1
+
+    offsets = np.full((len(names), len(names)), np.nan)
+    scores = np.full((len(names), len(names)), np.nan)
+    np.fill_diagonal(offsets, 0.0)
+    np.fill_diagonal(scores, 1.0)
+
+    shm, layout = _share_signals(signals)
+    total = sum(length for _, length in layout.values())
+    print(f"Correlating {len(pairs)} pairs of {len(names)} sources on {max_workers} processes...")
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_attach_signals,
+                                 initargs=(shm.name, layout, total, rate)) as pool:
+            chunksize = max(1, len(pairs) // (4 * max_workers))
+            for name1, name2, time_diff, peak_score in pool.map(_correlate_pair, pairs, chunksize=chunksize):
+                i, j = index[name1], index[name2]
+                offsets[i, j], offsets[j, i] = time_diff, -time_diff
+                scores[i, j] = scores[j, i] = peak_score
+    finally:
+        shm.close()
+        shm.unlink()
+    return names, offsets, scores
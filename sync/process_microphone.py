@@ -6,6 +6,9 @@ import matplotlib.pyplot as plt
 import datetime
 import matplotlib.dates as mdates
 import numpy as np
+from utils import normalize_audio
+
+ARCHIVE_MANIFEST = 'manifest.json'
 
 def timecode_to_seconds(tc: str, fps=25):
     parts = list(map(int, tc.split(':')))
@@ -34,20 +37,46 @@ def get_file_info(filepath):
     return timecode, duration
 
 
+def archive_track_path(archive_dir, track_index):
+    """Path of one track in a per-track archive written by recorder_archive."""
+    return os.path.join(archive_dir, f"track_{track_index:02d}.flac")
+
+
+def read_archive_manifest(archive_dir):
+    """Manifest of a per-track archive directory, or None if it is not one."""
+    manifest_path = os.path.join(archive_dir, ARCHIVE_MANIFEST)
+    if not os.path.isfile(manifest_path):
+        return None
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+
 def build_file_timeline(audio_dir, fps):
+    """
+    Timeline of the recorder files in audio_dir. Multitrack WAVs and per-track
+    archive directories (see recorder_archive) are both recognized; a WAV whose
+    archive sits next to it is left out in favour of the archive.
+    """
     timeline = []
     for fname in sorted(os.listdir(audio_dir)):
+        full_path = os.path.join(audio_dir, fname)
         if fname.lower().endswith('.wav'):
-            full_path = os.path.join(audio_dir, fname)
+            if read_archive_manifest(os.path.splitext(full_path)[0]):
+                continue
             timecode, duration = get_file_info(full_path)
-            if timecode:
-                start_sec = timecode_to_seconds(timecode, fps)
-                end_sec = start_sec + duration
-                timeline.append({
-                    'filename': full_path,
-                    'start_time': start_sec,
-                    'end_time': end_sec
-                })
+        elif os.path.isdir(full_path) and read_archive_manifest(full_path):
+            manifest = read_archive_manifest(full_path)
+            timecode, duration = manifest['timecode'], manifest['duration']
+        else:
+            continue
+        if timecode:
+            start_sec = timecode_to_seconds(timecode, fps)
+            end_sec = start_sec + duration
+            timeline.append({
+                'filename': full_path,
+                'start_time': start_sec,
+                'end_time': end_sec
+            })
     return timeline
 
 
@@ -61,13 +90,91 @@ def find_files_for_range(timeline, start_sec, end_sec):
     return result
 
 
+def _track_source(filepath, track_index):
+    """File and channel holding a track: the multitrack file itself or its per-track archive file."""
+    if os.path.isdir(filepath):
+        return archive_track_path(filepath, track_index), 0
+    return filepath, track_index
+
+
+def _read_track_into(filepath, track_index, start_sample, out, blocksize=65536, samplerate=None, opener=sf.SoundFile):
+    """
+    Fill out with one track of filepath starting at start_sample, reading block by block.
+    opener returns a context manager yielding an open SoundFile, so callers can reuse handles.
+    """
+    filepath, track_index = _track_source(filepath, track_index)
+    pos = 0
+    with opener(filepath) as f:
+        assert samplerate is None or f.samplerate == samplerate, "Sample rate mismatch"
+        f.seek(start_sample)
+        while pos < len(out):
+            block = f.read(min(blocksize, len(out) - pos), dtype='float32', always_2d=True)
+            if len(block) == 0:
+                break
+            out[pos:pos + len(block)] = block[:, track_index]
+            pos += len(block)
+    return pos
+
+
 def extract_audio_segment(filepath, track_index, start_time, end_time, file_start, samplerate):
-    data, sr = sf.read(filepath)
+    sr = sf.info(_track_source(filepath, track_index)[0]).samplerate
     assert sr == samplerate, "Sample rate mismatch"
-    channel_data = data[:, track_index]
     start_sample = int((start_time - file_start) * sr)
     end_sample = int((end_time - file_start) * sr)
-    return channel_data[start_sample:end_sample]
+    # Read only the requested window, decoded straight to float32
+    segment = np.empty(max(end_sample - start_sample, 0), dtype=np.float32)
+    n_read = _read_track_into(filepath, track_index, start_sample, segment)
+    return segment[:n_read]
+
+
+def read_audio_range(timeline, track_index, start_sec, end_sec, samplerate, gap_value=np.nan, opener=sf.SoundFile):
+    """
+    Read one track over a timecode range that may span several recorder files.
+
+    The output is preallocated for the whole range and each file writes only its
+    own span into it; samples not covered by any file are set to gap_value.
+    Args:
+        timeline: File timeline from build_file_timeline
+        track_index: Track to read (0-based)
+        start_sec, end_sec: Range in timecode seconds
+        samplerate: Expected sample rate of the files
+        gap_value: Fill value for gaps between files (default: NaN, which matplotlib leaves blank)
+        opener: Callable opening a file as a SoundFile context manager (default: sf.SoundFile)
+    Returns:
+        waveform: float32 array of round((end_sec - start_sec) * samplerate) samples
+        boundaries: List of dicts with 'filename', 'start_sample', 'end_sample' for each file's span
+        gaps: List of (start_sample, end_sample) ranges not covered by any file
+    """
+    n_total = int(round((end_sec - start_sec) * samplerate))
+    waveform = np.full(n_total, gap_value, dtype=np.float32)
+    boundaries = []
+    gaps = []
+    covered_until = 0
+
+    for file_info in find_files_for_range(timeline, start_sec, end_sec):
+        file_start = file_info['start_time']
+        filepath = file_info['filename']
+
+        seg_start = max(start_sec, file_start)
+        seg_end = min(end_sec, file_info['end_time'])
+        dst_lo = min(int(round((seg_start - start_sec) * samplerate)), n_total)
+        dst_hi = min(int(round((seg_end - start_sec) * samplerate)), n_total)
+        if dst_hi <= dst_lo:
+            continue
+
+        src_start = int(round((seg_start - file_start) * samplerate))
+        n_read = _read_track_into(filepath, track_index, src_start, waveform[dst_lo:dst_hi],
+                                  samplerate=samplerate, opener=opener)
+        dst_hi = dst_lo + n_read
+
+        if dst_lo > covered_until:
+            gaps.append((covered_until, dst_lo))
+        covered_until = max(covered_until, dst_hi)
+        boundaries.append({'filename': filepath, 'start_sample': dst_lo, 'end_sample': dst_hi})
+
+    if covered_until < n_total:
+        gaps.append((covered_until, n_total))
+    return waveform, boundaries, gaps
 
 
 def plot_audio_waveform_by_timecode(audio_dir, start_tc, end_tc, track_index=1, fps=25, samplerate=48000, ax=None, base_date=None, base_tz=None):
@@ -85,8 +192,6 @@ def plot_audio_waveform_by_timecode(audio_dir, start_tc, end_tc, track_index=1,
         print("! No files found for the given timecode range.")
         return
 
-    waveform = []
-    times = []
     # Use a reference date (e.g., today)
     if base_date is None:
         ref_date = datetime.datetime.today().replace(hour=0, minute=0, second=0, microsecond=0)
@@ -95,25 +200,18 @@ def plot_audio_waveform_by_timecode(audio_dir, start_tc, end_tc, track_index=1,
     if base_tz is not None:
         ref_date = ref_date.replace(tzinfo=base_tz)
 
-    for file_info in selected_files:
-        file_start = file_info['start_time']
-        file_end = file_info['end_time']
-        filepath = file_info['filename']
-
-        seg_start = max(start_sec, file_start)
-        seg_end = min(end_sec, file_end)
+    waveform, boundaries, gaps = read_audio_range(timeline, track_index, start_sec, end_sec, samplerate)
+    for b in boundaries:
+        print(f"  {os.path.basename(b['filename'])}: "
+              f"{start_sec + b['start_sample'] / samplerate:.3f}s - {start_sec + b['end_sample'] / samplerate:.3f}s")
+    for gap_lo, gap_hi in gaps:
+        print(f"! Gap without audio: {start_sec + gap_lo / samplerate:.3f}s - {start_sec + gap_hi / samplerate:.3f}s")
 
-        segment = extract_audio_segment(filepath, track_index, seg_start, seg_end, file_start, samplerate)
-        waveform.extend(segment)
-        n_samples = len(segment)
-        # Each sample's absolute time as datetime
-        segment_times = [ref_date + datetime.timedelta(seconds=seg_start + i / samplerate) for i in range(n_samples)]
-        times.extend(segment_times)
+    # Each sample's absolute time as a matplotlib date number
+    times = mdates.date2num(ref_date) + (start_sec + np.arange(len(waveform)) / samplerate) / 86400.0
 
     # Normalize waveform before plotting
-    if len(waveform) > 0:
-        waveform = np.array(waveform)
-        waveform = waveform / np.max(np.abs(waveform))
+    waveform = normalize_audio(waveform)
 
     # 绘图
     if ax is None:
@@ -128,6 +226,7 @@ def plot_audio_waveform_by_timecode(audio_dir, start_tc, end_tc, track_index=1,
     ax.legend(fontsize='small')
     plt.tight_layout()
     # Do not call plt.show() here
+    return waveform, boundaries, gaps
 
 # usage
 
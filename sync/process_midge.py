@@ -1,11 +1,12 @@
 import os
 from datetime import datetime, timedelta, timezone
-from scipy.io import wavfile
 import re
 import numpy as np
-from utils import normalize_audio
+import soundfile as sf
+from utils import normalize_audio, read_wav, to_float32, to_timestamp, window_sample_range
 
 TIMEZONE = timezone(timedelta(hours=2))
+MIDGE_FILE_PATTERN = re.compile(r'(\d+)_audio_(\d+)\.wav$')
 
 def plot_midge_audio_old(wav_path, plt_obj, camera_start_time, start_time_str=None, end_time_str=None, target_rate=4000):
     """
@@ -19,16 +20,11 @@ def plot_midge_audio_old(wav_path, plt_obj, camera_start_time, start_time_str=No
     unix_timestamp = int(match.group(1))
     start_time = datetime.fromtimestamp(np.floor(unix_timestamp / 1000), timezone(timedelta(hours=2)))
 
-    # Load audio
-    rate, data = wavfile.read(wav_path)
-    
-    # Normalize the audio data
-    data = normalize_audio(data)
-    
-    # Generate timestamps
-    timestamps = [start_time + timedelta(seconds=i / rate) for i in range(len(data))]
+    # Memory-map audio in its native dtype; only the used window is converted
+    rate, data = read_wav(wav_path)
 
     # Filter data based on time range if specified
+    lo, hi = 0, len(data)
     if start_time_str and end_time_str:
         # Parse time with possible milliseconds
         try:
@@ -44,10 +40,14 @@ def plot_midge_audio_old(wav_path, plt_obj, camera_start_time, start_time_str=No
         start_range = datetime.combine(camera_start_time.date(), start_range_time, tzinfo=timezone(timedelta(hours=2)))
         end_range = datetime.combine(camera_start_time.date(), end_range_time, tzinfo=timezone(timedelta(hours=2)))
         
-        # Filter data points within range
-        mask = [(t >= start_range and t <= end_range) for t in timestamps]
-        timestamps = [t for t, m in zip(timestamps, mask) if m]
-        data = data[mask]
+        # Keep only the samples within range
+        lo, hi = window_sample_range(start_time, rate, len(data), start_range, end_range)
+
+    # Normalize the audio data
+    data = normalize_audio(data[lo:hi])
+
+    # Generate timestamps
+    timestamps = [start_time + timedelta(seconds=i / rate) for i in range(lo, hi)]
 
     # # Downsample the data
     # data = downsample_audio(data, rate, target_rate)
@@ -70,14 +70,11 @@ def plot_midge_audio(wav_path, timestamps_path, plt_obj, start_time_str=None, en
         timestamps = [datetime.fromtimestamp(int(line.strip()) / 1000, tz=TIMEZONE) for line in f if line.strip()]
     timestamps = np.array(timestamps)
 
-    # Load audio
-    rate, data = wavfile.read(wav_path)
+    # Memory-map audio in its native dtype; only the used blocks are converted
+    rate, data = read_wav(wav_path)
     if data.ndim > 1:
         data = data[:, 0]  # Use first channel if stereo
 
-    # Normalize
-    data = data / np.max(np.abs(data))
-
     # Handle block structure
     block_size = len(data) // len(timestamps)
     if len(data) % len(timestamps) != 0:
@@ -102,8 +99,14 @@ def plot_midge_audio(wav_path, timestamps_path, plt_obj, start_time_str=None, en
         # Mask on original timestamps
         mask = (timestamps >= start_range) & (timestamps <= end_range)
         timestamps = timestamps[mask]
-        # Mask the audio blocks
-        data = data.reshape(-1, block_size)[mask].reshape(-1)
+        # Mask the audio blocks (timestamps are sorted, so the mask is one contiguous run)
+        selected = np.flatnonzero(mask)
+        if len(selected) == 0:
+            raise ValueError("No midge audio blocks within the requested time range")
+        data = data[selected[0] * block_size:(selected[-1] + 1) * block_size]
+
+    # Normalize
+    data = normalize_audio(data)
 
     # Now interpolate only the filtered timestamps and data
     timestamps_float = np.array([t.timestamp() for t in timestamps])
@@ -119,3 +122,185 @@ def plot_midge_audio(wav_path, timestamps_path, plt_obj, start_time_str=None, en
     plt_obj.legend(fontsize='small')
     return data, interp_times, rate
 
+
+def _first_last_line(path):
+    """Read the first and last non-empty lines of a text file without reading the middle."""
+    with open(path, 'rb') as f:
+        first = f.readline().strip()
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        tail = b''
+        pos = size
+        while pos > 0 and tail.strip().count(b'\n') < 1:
+            step = min(256, pos)
+            pos -= step
+            f.seek(pos)
+            tail = f.read(step) + tail
+    lines = [line for line in tail.split(b'\n') if line.strip()]
+    return first, (lines[-1].strip() if lines else first)
+
+
+def block_sample_times(block_times, block_size, rate, gap_factor=1.5):
+    """
+    Time of every sample of consecutive midge blocks.
+
+    Each block is spread evenly between its timestamp and the next one, as in
+    plot_midge_audio, so millisecond rounding neither overlaps blocks nor leaves
+    holes between them. A spacing above gap_factor block durations is a dropped
+    block: the block before it keeps the nominal rate and the gap stays visible.
+    Timestamps are first made to advance by at least half a block, so the
+    returned times always increase, even when a timestamp jitters backwards.
+    Args:
+        block_times: POSIX time in seconds of the first sample of each block
+        block_size: Samples per block
+        rate: Nominal sample rate
+        gap_factor: Spacing, in block durations, above which blocks are not contiguous
+    Returns:
+        Array of len(block_times) * block_size POSIX times
+    """
+    block_duration = block_size / rate
+    min_step = 0.5 * block_duration * np.arange(len(block_times))
+    starts = np.maximum.accumulate(np.asarray(block_times, dtype=np.float64) - min_step) + min_step
+    ends = np.append(starts[1:], starts[-1] + block_duration)
+    ends = np.where(ends - starts > gap_factor * block_duration, starts + block_duration, ends)
+    return (starts[:, np.newaxis] + (ends - starts)[:, np.newaxis] * (np.arange(block_size) / block_size)).reshape(-1)
+
+
+class MidgeSession:
+    """
+    All recordings of one midge badge as a single lazily loaded timeline.
+
+    Midges split a recording into `<unix_ms>_audio_<n>.wav` files, each with a
+    -ts.txt sidecar holding one unix-millisecond timestamp per block of samples.
+    Only the first and last timestamp of each sidecar are read when indexing;
+    audio and full timestamp lists are loaded for the files a window touches.
+    """
+
+    def __init__(self, directory, block_size=1024):
+        """
+        Args:
+            directory: Directory holding the badge's WAV files and sidecars
+            block_size: Samples per timestamp (default: 1024); None derives it
+                        per file from the sample and timestamp counts
+        """
+        self.directory = directory
+        self.block_size = block_size
+        self.files = []
+        for fname in os.listdir(directory):
+            if not MIDGE_FILE_PATTERN.search(fname):
+                continue
+            wav_path = os.path.join(directory, fname)
+            ts_path = os.path.splitext(wav_path)[0] + '-ts.txt'
+            if not os.path.exists(ts_path):
+                print(f"Warning: no timestamps for {fname}, skipping")
+                continue
+            first, last = _first_last_line(ts_path)
+            if not first:
+                continue
+            info = sf.info(wav_path)
+            file_block_size = block_size
+            if file_block_size is None:
+                with open(ts_path, 'rb') as f:
+                    n_timestamps = sum(1 for line in f if line.strip())
+                file_block_size = max(1, info.frames // n_timestamps)
+            self.files.append({
+                'wav_path': wav_path,
+                'ts_path': ts_path,
+                'rate': info.samplerate,
+                'block_size': file_block_size,
+                'start_time': int(first) / 1000,
+                'end_time': int(last) / 1000 + file_block_size / info.samplerate,
+            })
+        self.files.sort(key=lambda f: f['start_time'])
+        if not self.files:
+            raise ValueError(f"No midge recordings with timestamps found in {directory}")
+        print(f"Midge session {directory}: {len(self.files)} file(s), "
+              f"{datetime.fromtimestamp(self.start_time, TIMEZONE)} to {datetime.fromtimestamp(self.end_time, TIMEZONE)}")
+
+    @property
+    def start_time(self):
+        return self.files[0]['start_time']
+
+    @property
+    def end_time(self):
+        return self.files[-1]['end_time']
+
+    def files_for_range(self, start, end):
+        """Index entries of the files overlapping [start, end] (POSIX seconds)."""
+        return [f for f in self.files if f['start_time'] <= end and f['end_time'] > start]
+
+    def _load_blocks(self, file_info, start, end):
+        with open(file_info['ts_path'], 'r') as f:
+            block_times = np.array([int(line) for line in f if line.strip()]) / 1000
+        rate, data = read_wav(file_info['wav_path'])
+        if data.ndim > 1:
+            data = data[:, 0]  # Use first channel if stereo
+
+        block_size = file_info['block_size']
+        name = os.path.basename(file_info['wav_path'])
+        if len(block_times) and len(data) // len(block_times) != block_size:
+            print(f"Warning: {name} has {len(data)} samples for {len(block_times)} timestamps "
+                  f"({len(data) // len(block_times)} per timestamp), but block_size is {block_size}")
+        n_blocks = min(len(block_times), len(data) // block_size)
+        if n_blocks != len(block_times) or len(data) != n_blocks * block_size:
+            print(f"Warning: {name} has {len(data)} samples for "
+                  f"{len(block_times)} timestamps; using {n_blocks} complete blocks")
+        if n_blocks == 0:
+            return None, None
+        times = block_sample_times(block_times[:n_blocks], block_size, rate)
+
+        selected = np.flatnonzero((times[block_size - 1::block_size] >= start) & (times[::block_size] <= end))
+        if len(selected) == 0:
+            return None, None
+        first, last = selected[0], selected[-1] + 1
+        blocks = to_float32(data[first * block_size:last * block_size])
+        return blocks, times[first * block_size:last * block_size]
+
+    def load(self, start, end):
+        """
+        Load the audio between two global times.
+        Args:
+            start, end: Window bounds (datetime or POSIX seconds)
+        Returns:
+            data: float32 samples (first channel) of every block intersecting the window
+            times: POSIX time in seconds of each sample
+        """
+        start, end = to_timestamp(start), to_timestamp(end)
+        parts, times = [], []
+        for file_info in self.files_for_range(start, end):
+            blocks, block_times = self._load_blocks(file_info, start, end)
+            if blocks is not None:
+                parts.append(blocks)
+                times.append(block_times)
+        if not parts:
+            return np.zeros(0, dtype=np.float32), np.zeros(0)
+        return np.concatenate(parts), np.concatenate(times)
+
+    def load_on_grid(self, start, end, gap_value=np.nan):
+        """
+        Load the audio between two global times on a regular sample grid.
+        The samples are interpolated from their block-spread times onto the grid;
+        only grid points inside a dropped block or outside the recordings are gaps,
+        like the uncovered spans of process_microphone.read_audio_range.
+        Returns:
+            data: float32 array of round((end - start) * rate) samples, gap_value where uncovered
+            rate: Sample rate of the grid
+        """
+        start, end = to_timestamp(start), to_timestamp(end)
+        rate = self.files[0]['rate']
+        grid = start + np.arange(int(round((end - start) * rate))) / rate
+        samples, times = self.load(start, end)
+        if len(samples) == 0:
+            return np.full(len(grid), gap_value, dtype=np.float32), rate
+        if np.any(np.diff(times) <= 0):
+            # Files overlapping in time; interpolation needs increasing times
+            order = np.argsort(times, kind='stable')
+            samples, times = samples[order], times[order]
+        data = np.interp(grid, times, samples).astype(np.float32)
+
+        # Within a block the sample spacing stays below 1.5 / rate; anything wider is a gap
+        before = np.clip(np.searchsorted(times, grid, side='right') - 1, 0, len(times) - 1)
+        spacing = np.append(np.diff(times), np.inf)[before]
+        covered = (grid >= times[0]) & ((spacing <= 2.0 / rate) | (grid - times[before] <= 1.0 / rate))
+        data[~covered] = gap_value
+        return data, rate
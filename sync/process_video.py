@@ -1,8 +1,7 @@
 import os
 import matplotlib.pyplot as plt
 from datetime import datetime, date, time, timedelta, timezone
-from scipy.io import wavfile
-from utils import normalize_audio
+from utils import normalize_audio, read_wav, window_sample_range
 import subprocess
 
 
@@ -45,13 +44,10 @@ def plot_camera_audio(wav_path, timecode_str, plt_obj=None, manual_date=None, st
     """
     Plot audio waveform aligned with real time from video timecode.
     """
-    # Load audio
-    rate, data = wavfile.read(wav_path)
+    # Memory-map audio in its native dtype; only the used window is converted
+    rate, data = read_wav(wav_path)
     duration = len(data) / rate
 
-    # Normalize the audio data
-    data = normalize_audio(data)
-
     # Parse timecode (format: HH:MM:SS:FF)
     hours, minutes, seconds, frames = map(int, timecode_str.split(':'))
     # Convert frames to microseconds using the exact frame rate
@@ -60,10 +56,8 @@ def plot_camera_audio(wav_path, timecode_str, plt_obj=None, manual_date=None, st
                                 time(hours, minutes, seconds, microseconds),
                                 tzinfo=timezone(timedelta(hours=2)))
 
-    # Generate timestamps for x-axis
-    timestamps = [start_time + timedelta(seconds=i / rate) for i in range(len(data))]
-
     # Filter data based on time range if specified
+    lo, hi = 0, len(data)
     if start_time_str and end_time_str:
         # Parse time with possible milliseconds
         try:
@@ -79,10 +73,12 @@ def plot_camera_audio(wav_path, timecode_str, plt_obj=None, manual_date=None, st
         start_range = datetime.combine(manual_date or date.today(), start_range_time, tzinfo=timezone(timedelta(hours=2)))
         end_range = datetime.combine(manual_date or date.today(), end_range_time, tzinfo=timezone(timedelta(hours=2)))
         
-        # Filter data points within range
-        mask = [(t >= start_range and t <= end_range) for t in timestamps]
-        timestamps = [t for t, m in zip(timestamps, mask) if m]
-        data = data[mask]
+        # Keep only the samples within range
+        lo, hi = window_sample_range(start_time, rate, len(data), start_range, end_range)
+
+    data = normalize_audio(data[lo:hi])
+    # Generate timestamps for x-axis
+    timestamps = [start_time + timedelta(seconds=i / rate) for i in range(lo, hi)]
 
     # # Downsample the data
     # data = downsample_audio(data, rate, target_rate)
@@ -0,0 +1,261 @@
+import io
+import json
+import argparse
+import threading
+import urllib.request
+from collections import OrderedDict
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+import cv2
+import numpy as np
+import soundfile as sf
+from camera_frames import build_camera_session, resolve_frame_index
+from process_microphone import build_file_timeline, read_audio_range
+from process_midge import TIMEZONE, MidgeSession
+from session_store import SessionStore
+
+
+class WindowCache:
+    """Thread-safe LRU cache of decoded windows, bounded by total size in bytes."""
+
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.items:
+                return None
+            self.items.move_to_end(key)
+            return self.items[key][0]
+
+    def put(self, key, value, nbytes):
+        with self.lock:
+            if key in self.items:
+                return
+            self.items[key] = (value, nbytes)
+            self.size += nbytes
+            while self.size > self.max_bytes and len(self.items) > 1:
+                _, (_, old_bytes) = self.items.popitem(last=False)
+                self.size -= old_bytes
+
+
+class _SharedHandle:
+    """An open file shared between requests; entering it takes the file's lock."""
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        self.lock.acquire()
+        return self.handle
+
+    def __exit__(self, *exc):
+        self.lock.release()
+
+
+class QueryService:
+    """
+    Warm state behind the query daemon.
+
+    Timelines, camera metadata and midge indexes are built once at start-up;
+    audio files and videos stay open, and decoded windows are kept in an LRU cache.
+    All times are global POSIX seconds.
+    """
+
+    def __init__(self, config, cache_bytes=512 * 1024 * 1024):
+        """
+        Args:
+            config: Dict with 'base_date' (YYYY-MM-DD) and any of
+                    'recorders': {name: {'dir', 'fps', 'samplerate'}},
+                    'midges': {name: {'dir', 'block_size'}},
+                    'stores': {name: {'dir', 'source'}} (session_store sources),
+                    'cameras': {name: {'path', 'offset'}}
+            cache_bytes: Size bound of the window cache in bytes
+        """
+        self.cache = WindowCache(cache_bytes)
+        self.handles = {}
+        self.handles_lock = threading.Lock()
+        self.recorders = {}
+        self.midges = {}
+        self.stores = {}
+        self.cameras = {}
+
+        base_date = date.fromisoformat(config['base_date'])
+        day_start = datetime.combine(base_date, datetime.min.time(), tzinfo=TIMEZONE).timestamp()
+        for name, source in config.get('recorders', {}).items():
+            print(f"Building timeline for {name}...")
+            self.recorders[name] = {
+                'timeline': build_file_timeline(source['dir'], source['fps']),
+                'samplerate': source['samplerate'],
+                'day_start': day_start,
+            }
+        for name, source in config.get('midges', {}).items():
+            self.midges[name] = MidgeSession(source['dir'], source.get('block_size', 1024))
+        for name, source in config.get('stores', {}).items():
+            # A store holds many sources; each configured name maps to one of them
+            self.stores[name] = (SessionStore(source['dir']), source.get('source', name))
+        cameras = config.get('cameras', {})
+        if cameras:
+            paths = [c['path'] for c in cameras.values()]
+            offsets = {c['path']: c.get('offset', 0.0) for c in cameras.values()}
+            for name, camera in zip(cameras, build_camera_session(paths, base_date, offsets)):
+                self.cameras[name] = {'info': camera, 'capture': None, 'lock': threading.Lock()}
+
+    def _open_audio(self, path):
+        with self.handles_lock:
+            if path not in self.handles:
+                self.handles[path] = _SharedHandle(sf.SoundFile(path))
+            return self.handles[path]
+
+    def sources(self):
+        return {
+            'recorders': list(self.recorders),
+            'midges': list(self.midges),
+            'stores': list(self.stores),
+            'cameras': list(self.cameras),
+        }
+
+    def audio(self, source, t0, t1, track=0):
+        """Audio of a source between two global times as (float32 samples, samplerate); gaps are NaN."""
+        key = ('audio', source, t0, t1, track)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        if source in self.recorders:
+            rec = self.recorders[source]
+            data, _, _ = read_audio_range(rec['timeline'], track, t0 - rec['day_start'], t1 - rec['day_start'],
+                                          rec['samplerate'], opener=self._open_audio)
+            rate = rec['samplerate']
+        elif source in self.midges:
+            if track != 0:
+                raise ValueError(f"{source} is a midge and only has track 0")
+            data, rate = self.midges[source].load_on_grid(t0, t1)
+        elif source in self.stores:
+            store, store_source = self.stores[source]
+            data = np.array(store.read(store_source, t0, t1 - t0, track))
+            rate = store.rate
+        else:
+            raise KeyError(f"Unknown audio source: {source}")
+        self.cache.put(key, (data, rate), data.nbytes)
+        return data, rate
+
+    def frame(self, camera, t):
+        """JPEG bytes of the frame a camera shows at a global time."""
+        cam = self.cameras[camera]
+        frame_idx = resolve_frame_index(cam['info'], t)
+        if not 0 <= frame_idx < cam['info']['n_frames']:
+            raise ValueError(f"{camera} is not recording at {t}")
+        key = ('frame', camera, frame_idx)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        with cam['lock']:
+            if cam['capture'] is None:
+                cam['capture'] = cv2.VideoCapture(cam['info']['path'])
+                cam['next_frame'] = 0
+            cap = cam['capture']
+            # Seeking is costly; read forward instead when the frame is just ahead.
+            # next_frame is None when the decoder position is unknown.
+            if cam['next_frame'] is None or not 0 <= frame_idx - cam['next_frame'] < 30:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+                cam['next_frame'] = frame_idx
+            frame = None
+            while cam['next_frame'] <= frame_idx:
+                ret, frame = cap.read()
+                if not ret:
+                    cam['next_frame'] = None
+                    raise ValueError(f"Could not read frame {frame_idx} of {camera}")
+                cam['next_frame'] += 1
+        ok, buf = cv2.imencode('.jpg', frame)
+        if not ok:
+            raise ValueError(f"Could not encode frame {frame_idx} of {camera}")
+        data = buf.tobytes()
+        self.cache.put(key, data, len(data))
+        return data
+
+
+class _QueryHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        try:
+            if url.path == '/sources':
+                self._send(200, json.dumps(self.service.sources()).encode('utf-8'), 'application/json')
+            elif url.path == '/audio':
+                data, rate = self.service.audio(params['source'], float(params['t0']), float(params['t1']),
+                                                int(params.get('track', 0)))
+                buf = io.BytesIO()
+                np.save(buf, data)
+                self._send(200, buf.getvalue(), 'application/octet-stream', {'X-Samplerate': str(rate)})
+            elif url.path == '/frame':
+                self._send(200, self.service.frame(params['camera'], float(params['t'])), 'image/jpeg')
+            else:
+                self._send(404, b'Unknown endpoint', 'text/plain')
+        except (KeyError, ValueError, IndexError) as e:
+            self._send(400, str(e).encode('utf-8'), 'text/plain')
+        except Exception as e:
+            print(f"Error serving {self.path}: {type(e).__name__}: {e}")
+            self._send(500, f"{type(e).__name__}: {e}".encode('utf-8'), 'text/plain')
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(config, host='127.0.0.1', port=8765, cache_bytes=512 * 1024 * 1024):
+    """Start the query daemon on localhost and serve requests until interrupted."""
+    _QueryHandler.service = QueryService(config, cache_bytes)
+    server = ThreadingHTTPServer((host, port), _QueryHandler)
+    print(f"Query daemon listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def query_audio(source, t0, t1, track=0, host='127.0.0.1', port=8765):
+    """Client helper: audio of a source between two global times as (float32 samples, samplerate)."""
+    query = urlencode({'source': source, 't0': t0, 't1': t1, 'track': track})
+    with urllib.request.urlopen(f"http://{host}:{port}/audio?{query}") as response:
+        rate = float(response.headers['X-Samplerate'])
+        return np.load(io.BytesIO(response.read())), rate
+
+
+def query_frame(camera, t, host='127.0.0.1', port=8765):
+    """Client helper: decoded frame a camera shows at a global time."""
+    query = urlencode({'camera': camera, 't': t})
+    with urllib.request.urlopen(f"http://{host}:{port}/frame?{query}") as response:
+        return cv2.imdecode(np.frombuffer(response.read(), dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local query daemon for windowed audio/frame access")
+    parser.add_argument("--config", required=True, help="JSON file describing the session sources")
+    parser.add_argument("--port", type=int, default=8765, help="Port on localhost (default: 8765)")
+    parser.add_argument("--cache_mb", type=int, default=512, help="Size of the window cache in MB (default: 512)")
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+    serve(config, port=args.port, cache_bytes=args.cache_mb * 1024 * 1024)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import os
+import json
+import shutil
+import subprocess
+import soundfile as sf
+from process_microphone import ARCHIVE_MANIFEST, archive_track_path, get_file_info
+
+# WAV subtypes FLAC stores losslessly; FLAC has no 32-bit or float samples, so
+# such recordings are left as WAV rather than truncated
+FLAC_SUBTYPES = {'PCM_24': 'PCM_24', 'PCM_16': 'PCM_16', 'PCM_S8': 'PCM_S8', 'PCM_U8': 'PCM_S8'}
+
+
+def add_seek_table(flac_path, timecode, seekpoint_interval=1.0):
+    """Add a dense seek table and the TIMECODE tag to a FLAC file using metaflac."""
+    cmd = ['metaflac', f'--add-seekpoint={seekpoint_interval:g}s']
+    if timecode:
+        cmd.append(f'--set-tag=TIMECODE={timecode}')
+    cmd.append(flac_path)
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"Warning: metaflac failed on {flac_path}: {result.stderr.strip()}")
+        return False
+    return True
+
+
+def archive_recorder_file(wav_path, archive_root, seekpoint_interval=1.0, blocksize=1 << 18):
+    """
+    Rewrite one multitrack recorder WAV as one lossless FLAC file per track.
+
+    The WAV is read once; every block is split across the track writers.
+    The archive directory gets a manifest with the original timecode and
+    duration, so build_file_timeline does not need to probe it.
+    Args:
+        wav_path: Multitrack recorder WAV
+        archive_root: Directory that receives <wav name>/track_XX.flac and the manifest
+        seekpoint_interval: Seconds between seek points (default: 1.0)
+        blocksize: Frames read per block (default: 262144)
+    Returns:
+        Path of the archive directory
+    Raises:
+        ValueError: If the WAV's sample format cannot be stored losslessly in FLAC
+    """
+    info = sf.info(wav_path)
+    if info.subtype not in FLAC_SUBTYPES:
+        raise ValueError(f"{wav_path} is {info.subtype}; FLAC cannot store it without losing precision")
+    subtype = FLAC_SUBTYPES[info.subtype]
+    timecode, duration = get_file_info(wav_path)
+    archive_dir = os.path.join(archive_root, os.path.splitext(os.path.basename(wav_path))[0])
+    os.makedirs(archive_dir, exist_ok=True)
+
+    print(f"Archiving {wav_path}: {info.channels} tracks, {duration:.1f}s, timecode {timecode}")
+    writers = [sf.SoundFile(archive_track_path(archive_dir, track), 'w', samplerate=info.samplerate,
+                            channels=1, format='FLAC', subtype=subtype)
+               for track in range(info.channels)]
+    try:
+        for writer in writers:
+            writer.comment = f"timecode={timecode}"
+        dtype = 'int16' if subtype == 'PCM_16' else 'int32'
+        for block in sf.blocks(wav_path, blocksize=blocksize, dtype=dtype, always_2d=True):
+            for track, writer in enumerate(writers):
+                writer.write(block[:, track])
+    finally:
+        for writer in writers:
+            writer.close()
+
+    if shutil.which('metaflac') is None:
+        print("Warning: metaflac not found; FLAC files are written without a dense seek table")
+    else:
+        for track in range(info.channels):
+            add_seek_table(archive_track_path(archive_dir, track), timecode, seekpoint_interval)
+
+    manifest = {
+        'source': os.path.basename(wav_path),
+        'timecode': timecode,
+        'duration': duration,
+        'samplerate': info.samplerate,
+        'frames': info.frames,
+        'n_tracks': info.channels,
+        'subtype': subtype,
+    }
+    with open(os.path.join(archive_dir, ARCHIVE_MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    original = os.path.getsize(wav_path)
+    archived = sum(os.path.getsize(archive_track_path(archive_dir, t)) for t in range(info.channels))
+    print(f"  {original / 1e9:.2f} GB -> {archived / 1e9:.2f} GB ({archived / original:.1%})")
+    return archive_dir
+
+
+def archive_recorder_dir(audio_dir, archive_root, **kwargs):
+    """Archive every recorder WAV in audio_dir that has not been archived yet."""
+    archived = []
+    for fname in sorted(os.listdir(audio_dir)):
+        if not fname.lower().endswith('.wav'):
+            continue
+        archive_dir = os.path.join(archive_root, os.path.splitext(fname)[0])
+        if os.path.exists(os.path.join(archive_dir, ARCHIVE_MANIFEST)):
+            print(f"Skipping {fname}: already archived")
+            continue
+        try:
+            archived.append(archive_recorder_file(os.path.join(audio_dir, fname), archive_root, **kwargs))
+        except ValueError as e:
+            print(f"Keeping {fname} as WAV: {e}")
+    return archived
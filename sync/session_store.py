@@ -0,0 +1,236 @@
+import os
+import json
+import shutil
+from fractions import Fraction
+import numpy as np
+from scipy import signal
+from utils import to_float32, to_timestamp
+
+INDEX_FILENAME = 'index.json'
+
+
+def resample_to_clock(data, rate, target_rate, drift=0.0):
+    """
+    Resample a 1-D signal onto the common session clock.
+    Args:
+        data: Audio data array (1-D)
+        rate: Nominal sample rate of the source
+        target_rate: Sample rate of the common clock
+        drift: Relative clock error of the source, i.e. the source actually
+               produces rate * (1 + drift) samples per global second
+    Returns:
+        float32 array sampled at target_rate on the global clock (integer PCM
+        is scaled to [-1, 1))
+    """
+    data = to_float32(data)
+    if rate != target_rate:
+        ratio = Fraction(target_rate / rate).limit_denominator(1000)
+        data = signal.resample_poly(data, ratio.numerator, ratio.denominator).astype(np.float32)
+    if drift:
+        # Small clock drift is corrected by linear interpolation on the global grid
+        n_out = int(round(len(data) / (1 + drift)))
+        src_pos = np.arange(n_out) * (1 + drift)
+        data = np.interp(src_pos, np.arange(len(data)), data).astype(np.float32)
+    return data
+
+
+def _chunk_path(store_dir, name, track, chunk_idx):
+    return os.path.join(store_dir, name, f"track_{track:02d}", f"chunk_{chunk_idx:06d}.npy")
+
+
+class SessionStoreWriter:
+    """
+    Write aligned sources into a chunked on-disk session store.
+
+    Every source is resampled to the common clock and cut into fixed-duration
+    chunks aligned on the global time grid, one .npy file per chunk and track,
+    so a window of any source can later be located without scanning.
+    """
+
+    def __init__(self, store_dir, session_start, rate=16000, chunk_duration=10.0):
+        """
+        Args:
+            store_dir: Output directory of the store
+            session_start: Global time (datetime or POSIX seconds) of global sample 0
+            rate: Sample rate of the common clock
+            chunk_duration: Duration of each chunk in seconds
+        """
+        self.store_dir = store_dir
+        self.session_start = to_timestamp(session_start)
+        self.rate = rate
+        self.chunk_samples = int(round(chunk_duration * rate))
+        self.sources = {}
+        os.makedirs(store_dir, exist_ok=True)
+
+    def add_source(self, name, data, rate, start_time, drift=0.0):
+        """
+        Resample a source to the common clock and write its chunks.
+        Calling it again with the same name appends another recording of that
+        source (e.g. the next file of a recorder or midge); chunks shared with
+        the earlier part are merged rather than overwritten.
+        Args:
+            name: Source name (e.g. 'camera_09', 'midge_59', 'mic')
+            data: Audio array, shape (n,) or (n, tracks)
+            rate: Nominal sample rate of the source
+            start_time: Global time (datetime or POSIX seconds) of the first sample,
+                        with any measured offset already applied
+            drift: Relative clock drift of the source (see resample_to_clock)
+        """
+        data = np.asarray(data)
+        if data.ndim == 1:
+            data = data[:, np.newaxis]
+        start_time = to_timestamp(start_time)
+        start_sample = int(round((start_time - self.session_start) * self.rate))
+        if start_sample < 0:
+            raise ValueError(f"Source {name} starts before the session start")
+        previous = self.sources.get(name)
+        if previous is not None and previous['n_tracks'] != data.shape[1]:
+            raise ValueError(f"Source {name} already has {previous['n_tracks']} track(s), got {data.shape[1]}")
+
+        if previous is None and os.path.isdir(os.path.join(self.store_dir, name)):
+            # Chunks left by an earlier run would show through gaps between appended parts
+            shutil.rmtree(os.path.join(self.store_dir, name))
+
+        n_samples = None
+        for track in range(data.shape[1]):
+            resampled = resample_to_clock(data[:, track], rate, self.rate, drift)
+            n_samples = len(resampled)
+            self._write_track(name, track, resampled, start_sample, append=previous is not None)
+
+        end_sample = start_sample + n_samples
+        if previous is not None:
+            start_time = min(start_time, previous['start_time'])
+            start_sample = min(start_sample, previous['start_sample'])
+            end_sample = max(end_sample, previous['end_sample'])
+        self.sources[name] = {
+            'start_time': start_time,
+            'original_rate': rate,
+            'drift': drift,
+            'n_tracks': data.shape[1],
+            'start_sample': start_sample,
+            'end_sample': end_sample,
+            'first_chunk': start_sample // self.chunk_samples,
+            'last_chunk': (end_sample - 1) // self.chunk_samples,
+        }
+        print(f"Stored {name}: {data.shape[1]} track(s), {n_samples / self.rate:.2f}s")
+
+    def _write_track(self, name, track, data, start_sample, append=False):
+        cs = self.chunk_samples
+        first_chunk = start_sample // cs
+        last_chunk = (start_sample + len(data) - 1) // cs
+        os.makedirs(os.path.dirname(_chunk_path(self.store_dir, name, track, 0)), exist_ok=True)
+        for chunk_idx in range(first_chunk, last_chunk + 1):
+            path = _chunk_path(self.store_dir, name, track, chunk_idx)
+            if append and os.path.exists(path):
+                # Chunk shared with an earlier part of this source: keep its samples
+                chunk = np.lib.format.open_memmap(path, mode='r+')
+            else:
+                chunk = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(cs,))
+                # Samples outside the recorded range stay zero
+                chunk[:] = 0
+            chunk_start = chunk_idx * cs
+            src_lo = max(0, chunk_start - start_sample)
+            src_hi = min(len(data), chunk_start + cs - start_sample)
+            dst_lo = start_sample + src_lo - chunk_start
+            chunk[dst_lo:dst_lo + (src_hi - src_lo)] = data[src_lo:src_hi]
+            chunk.flush()
+            del chunk
+
+    def close(self):
+        """Write the index of offsets, drift and chunk ranges."""
+        index = {
+            'session_start': self.session_start,
+            'rate': self.rate,
+            'chunk_samples': self.chunk_samples,
+            'dtype': 'float32',
+            'sources': self.sources,
+        }
+        with open(os.path.join(self.store_dir, INDEX_FILENAME), 'w') as f:
+            json.dump(index, f, indent=2)
+
+
+class SessionStore:
+    """
+    Random-access reader for a store written by SessionStoreWriter.
+
+    Chunks are memory-mapped on first use; a window that falls inside one chunk
+    is returned as a zero-copy view, otherwise the touched chunks are joined.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, INDEX_FILENAME), 'r') as f:
+            index = json.load(f)
+        self.session_start = index['session_start']
+        self.rate = index['rate']
+        self.chunk_samples = index['chunk_samples']
+        self.sources = index['sources']
+        self._chunks = {}
+
+    def _chunk(self, name, track, chunk_idx):
+        key = (name, track, chunk_idx)
+        if key not in self._chunks:
+            info = self.sources[name]
+            path = _chunk_path(self.store_dir, name, track, chunk_idx)
+            # Chunks in a gap between appended recordings were never written
+            if info['first_chunk'] <= chunk_idx <= info['last_chunk'] and os.path.exists(path):
+                self._chunks[key] = np.load(path, mmap_mode='r')
+            else:
+                self._chunks[key] = None
+        return self._chunks[key]
+
+    def time_to_sample(self, t):
+        """Global sample index of a global time (datetime or POSIX seconds)."""
+        return int(round((to_timestamp(t) - self.session_start) * self.rate))
+
+    def read(self, name, start, duration, track=0):
+        """
+        Read a window of one source track on the common clock.
+        Args:
+            name: Source name
+            start: Window start (datetime or POSIX seconds)
+            duration: Window length in seconds
+            track: Track index within the source (default: 0)
+        Returns:
+            float32 array of round(duration * rate) samples; regions where the
+            source did not record are zero
+        """
+        if name not in self.sources:
+            raise KeyError(f"Unknown source: {name}")
+        if not 0 <= track < self.sources[name]['n_tracks']:
+            raise IndexError(f"Source {name} has no track {track}")
+        if duration < 0:
+            raise ValueError(f"Negative window duration: {duration}")
+
+        cs = self.chunk_samples
+        lo = self.time_to_sample(start)
+        hi = lo + int(round(duration * self.rate))
+        if hi <= lo:
+            return np.zeros(0, dtype=np.float32)
+        first, last = lo // cs, (hi - 1) // cs
+
+        if first == last:
+            chunk = self._chunk(name, track, first)
+            if chunk is None:
+                return np.zeros(hi - lo, dtype=np.float32)
+            return chunk[lo - first * cs:hi - first * cs]
+
+        parts = []
+        for chunk_idx in range(first, last + 1):
+            a = max(lo, chunk_idx * cs) - chunk_idx * cs
+            b = min(hi, (chunk_idx + 1) * cs) - chunk_idx * cs
+            chunk = self._chunk(name, track, chunk_idx)
+            parts.append(np.zeros(b - a, dtype=np.float32) if chunk is None else chunk[a:b])
+        return np.concatenate(parts)
+
+    def read_many(self, requests, start, duration):
+        """
+        Read the same window from several sources.
+        Args:
+            requests: List of (name, track) pairs
+            start: Window start (datetime or POSIX seconds)
+            duration: Window length in seconds
+        Returns:
+            Dict mapping (name, track) to the window data
+        """
+        return {(name, track): self.read(name, start, duration, track) for name, track in requests}
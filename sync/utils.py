@@ -1,11 +1,64 @@
 import numpy as np
 from scipy import signal
+from scipy.io import wavfile
 from datetime import datetime, time, timedelta, timezone
 
 
-def normalize_audio(data):
-    """Normalize audio data to have maximum absolute value of 1.0"""
-    return data / np.max(np.abs(data))
+def read_wav(wav_path):
+    """Read a WAV file in its native dtype, memory-mapped where the format allows."""
+    try:
+        return wavfile.read(wav_path, mmap=True)
+    except ValueError:
+        # 24-bit data cannot be memory-mapped
+        return wavfile.read(wav_path)
+
+
+def to_float32(data):
+    """
+    Convert audio samples to float32, scaling integer PCM to [-1, 1).
+    Args:
+        data: Audio data array in its native dtype (int16, int32/int24, uint8 or float)
+    Returns:
+        float32 array (the input itself if it already is a writable float32 array)
+    """
+    data = np.asarray(data)
+    if data.dtype == np.float32 and data.flags.writeable:
+        return data
+    if data.dtype == np.uint8:
+        out = data.astype(np.float32)
+        out -= 128.0
+        out /= 128.0
+        return out
+    if np.issubdtype(data.dtype, np.integer):
+        out = data.astype(np.float32)
+        out /= float(-np.iinfo(data.dtype).min)
+        return out
+    return data.astype(np.float32)
+
+
+def normalize_audio(data, mode='peak', eps=1e-9):
+    """
+    Normalize audio data in place to peak (max absolute value of 1.0) or unit RMS.
+    Args:
+        data: Audio data array; converted to float32 first if needed
+        mode: 'peak' or 'rms' (default: 'peak')
+        eps: Level below which the signal is treated as silence and left unscaled
+    Returns:
+        The normalized float32 array
+    """
+    data = to_float32(data)
+    if data.size == 0:
+        return data
+    # NaN marks missing samples (e.g. gaps between files) and is ignored
+    if mode == 'peak':
+        level = np.nanmax(np.abs(data))
+    elif mode == 'rms':
+        level = np.sqrt(np.nanmean(np.square(data, dtype=np.float64)))
+    else:
+        raise ValueError(f"Unknown normalization mode: {mode}")
+    if np.isfinite(level) and level > eps:
+        data /= np.float32(level)
+    return data
 
 def downsample_audio(data, original_rate, target_rate=4000):
     """
@@ -25,6 +78,21 @@ def downsample_audio(data, original_rate, target_rate=4000):
     
     return downsampled_data
 
+def window_sample_range(start_time, rate, n_samples, start_range, end_range):
+    """
+    Sample indices [lo, hi) of the samples whose times fall inside [start_range, end_range].
+    Args:
+        start_time: datetime of sample 0
+        rate: Sample rate
+        n_samples: Number of samples in the signal
+        start_range, end_range: datetime bounds of the window (inclusive)
+    """
+    lo = int(np.ceil((start_range - start_time).total_seconds() * rate))
+    hi = int(np.floor((end_range - start_time).total_seconds() * rate)) + 1
+    lo = min(max(lo, 0), n_samples)
+    hi = min(max(hi, lo), n_samples)
+    return lo, hi
+
 def timecode_to_datetime(timecode_str, frame_rate, base_date):
     """
     Convert timecode (HH:MM:SS:FF) to datetime object.
@@ -43,20 +111,49 @@ def timecode_to_datetime(timecode_str, frame_rate, base_date):
                           tzinfo=timezone(timedelta(hours=2)))
 
 
+def to_timestamp(t):
+    """Convert a datetime (or POSIX seconds) to float POSIX seconds."""
+    if isinstance(t, datetime):
+        return t.timestamp()
+    return float(t)
+
+
+def find_signal_offset(data1, data2, rate):
+    """
+    Cross-correlate two signals sampled at the same rate and find the lag of maximum correlation.
+    Args:
+        data1, data2: Signal arrays (audio, envelopes or visual series)
+        rate: Common sample rate of both signals
+    Returns:
+        time_diff: Lag at maximum correlation in seconds (positive when an event in
+                   data2 appears later in data1)
+        correlation: Full cross-correlation (float32)
+        lags: Lag in samples for each correlation value
+        peak_score: Peak correlation divided by the product of the signal norms (0 to 1)
+    """
+    data1 = np.asarray(data1, dtype=np.float32)
+    data2 = np.asarray(data2, dtype=np.float32)
+    correlation = signal.correlate(data1, data2, mode='full')
+    lags = signal.correlation_lags(len(data1), len(data2), mode='full')
+
+    # Find lag at maximum correlation
+    max_corr_idx = np.argmax(correlation)
+    max_lag = lags[max_corr_idx]
+
+    # Convert lag to time difference
+    time_diff = max_lag / rate
+
+    norm = np.linalg.norm(data1) * np.linalg.norm(data2)
+    peak_score = float(correlation[max_corr_idx] / norm) if norm > 0 else 0.0
+    return time_diff, correlation, lags, peak_score
+
+
 def compute_cross_correlations(camera_data, midge1_data, midge2_data, camera_timestamps, midge1_timestamps, midge2_timestamps, rate):
     """Compute cross-correlations between audio segments and find time differences at maximum correlation."""
     def get_max_correlation(data1, data2, timestamps1, timestamps2, rate, label1, label2):
-        # Compute cross-correlation
-        correlation = signal.correlate(data1, data2, mode='full')
-        lags = signal.correlation_lags(len(data1), len(data2), mode='full')
-        
-        # Find lag at maximum correlation
-        max_corr_idx = np.argmax(correlation)
-        max_lag = lags[max_corr_idx]
-        
-        # Convert lag to time difference
-        time_diff = max_lag / rate
-        
+        time_diff, correlation, lags, _ = find_signal_offset(data1, data2, rate)
+        max_lag = int(round(time_diff * rate))
+
         # Get the actual timestamps at the points of maximum correlation
         if max_lag >= 0:
             start_time1 = timestamps1[0]
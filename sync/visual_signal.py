@@ -0,0 +1,107 @@
+import os
+import subprocess
+import numpy as np
+from feature_cache import source_cache_key
+from utils import find_signal_offset, normalize_audio
+
+VISUAL_CACHE_DIR = os.path.join("data", "camera", "visual")
+
+
+def _cache_path(video_path, cache_dir, fps, width, height):
+    # Keyed by absolute path, size and mtime: camera file names repeat across folders
+    video_name = os.path.splitext(os.path.basename(video_path))[0]
+    key = source_cache_key(video_path, None, {'fps': fps, 'width': width, 'height': height})
+    return os.path.join(cache_dir, f"{video_name}_{fps:g}fps_{width}x{height}_{key}.npz")
+
+
+def extract_visual_signals(video_path, fps=10, width=64, height=36, cache_dir=VISUAL_CACHE_DIR):
+    """
+    Compute per-frame global brightness and motion energy of a video.
+
+    ffmpeg decodes the video at reduced frame rate and resolution to grayscale
+    raw frames, which are reduced to two series without keeping the frames.
+    Results are cached next to other extracted camera data, keyed by the video's
+    path, size and mtime, and reused as long as the video file is unchanged.
+    Args:
+        video_path: Path to the input video file
+        fps: Sample rate of the output series (default: 10)
+        width, height: Decoding resolution (default: 64x36)
+        cache_dir: Directory of cached series
+    Returns:
+        Dict with 'brightness' and 'motion' float32 arrays and their 'rate'
+    """
+    cache_path = _cache_path(video_path, cache_dir, fps, width, height)
+    if os.path.exists(cache_path):
+        cached = np.load(cache_path)
+        return {'brightness': cached['brightness'], 'motion': cached['motion'], 'rate': float(cached['rate'])}
+
+    print(f"Extracting visual signals from {video_path} at {fps} fps, {width}x{height}")
+    cmd = [
+        'ffmpeg', '-v', 'error',
+        '-i', video_path,
+        '-an',
+        '-vf', f'fps={fps},scale={width}:{height}',
+        '-pix_fmt', 'gray',
+        '-f', 'rawvideo', '-'
+    ]
+    frame_bytes = width * height
+    brightness = []
+    motion = []
+    prev = None
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    while True:
+        buf = proc.stdout.read(frame_bytes)
+        if len(buf) < frame_bytes:
+            break
+        frame = np.frombuffer(buf, dtype=np.uint8).astype(np.float32)
+        brightness.append(frame.mean())
+        motion.append(0.0 if prev is None else np.abs(frame - prev).mean())
+        prev = frame
+    proc.stdout.close()
+    if proc.wait() != 0:
+        raise RuntimeError(f"ffmpeg failed to decode {video_path}")
+
+    signals = {
+        'brightness': np.array(brightness, dtype=np.float32),
+        'motion': np.array(motion, dtype=np.float32),
+        'rate': float(fps),
+    }
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez(cache_path, **signals)
+    print(f"  {len(brightness)} frames, cached to {cache_path}")
+    return signals
+
+
+def visual_sync_signal(signals, feature='brightness'):
+    """
+    Turn a visual series into a zero-mean, unit-RMS signal for correlation.
+    Brightness is differentiated so that flashes and lights-on steps become peaks.
+    """
+    if feature == 'brightness':
+        data = np.diff(signals['brightness'], prepend=signals['brightness'][:1])
+    elif feature == 'motion':
+        data = signals['motion'].copy()
+    else:
+        raise ValueError(f"Unknown visual feature: {feature}")
+    data -= data.mean() if len(data) else 0
+    return normalize_audio(data, mode='rms')
+
+
+def find_visual_offset(video_path1, video_path2, feature='brightness', fps=10, **kwargs):
+    """
+    Estimate the time offset between two cameras from their visual signals.
+    Args:
+        video_path1, video_path2: Camera video paths
+        feature: 'brightness' (flash / lights-on events) or 'motion'
+        fps: Sample rate of the visual series
+        kwargs: Passed on to extract_visual_signals
+    Returns:
+        time_diff: Offset in seconds (positive when an event in camera 2 appears later in camera 1)
+        peak_score: Normalized correlation peak (0 to 1)
+    """
+    data1 = visual_sync_signal(extract_visual_signals(video_path1, fps=fps, **kwargs), feature)
+    data2 = visual_sync_signal(extract_visual_signals(video_path2, fps=fps, **kwargs), feature)
+    time_diff, _, _, peak_score = find_signal_offset(data1, data2, fps)
+    print(f"Visual offset ({feature}) between {os.path.basename(video_path1)} and "
+          f"{os.path.basename(video_path2)}: {time_diff:.3f}s (score {peak_score:.3f})")
+    return time_diff, peak_score